@@ -0,0 +1,354 @@
+"""Нагрузочный тест бота: синтетические жители и специалисты проходят сценарии целиком.
+
+Роутер из handlers.py подключается к Dispatcher, вместо Telegram API работает
+RecordingSession из bench_webhook.py, обновления подаются через
+dp.feed_update. Сценарии:
+- resident: /start и создание заявки по всем шагам TicketState;
+- specialist: взятие заявки в работу и ее выполнение по шагам StatusChangeState
+  (заявку специалист выбирает с клавиатуры, которую прислал бот).
+
+Для каждого сценария печатаются пропускная способность, p50/p99 задержки
+шага и всего сценария, число SQL-запросов на сценарий (по счетчикам
+metrics.py) и ошибки. Результат дописывается строкой JSON в --results и
+сравнивается с предыдущим прогоном с теми же параметрами.
+
+Запуск: python bench_load.py --residents 2000 --specialists 200 --concurrency 500
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import InlineKeyboardMarkup, Update
+
+from bench_webhook import BENCH_TOKEN, RecordingSession
+
+PROBLEMS = [
+    ('problem_light', 'Перегорела лампочка'),
+    ('problem_water', 'Проблема с водой'),
+    ('problem_elevator', 'Не работает лифт'),
+    ('problem_other', 'Другое'),
+]
+RESIDENT_BASE_ID = 1_000_000
+SPECIALIST_BASE_ID = 2_000_000
+
+
+class LoadSession(RecordingSession):
+    """RecordingSession, которая помнит последнюю inline-клавиатуру в каждом чате"""
+
+    def __init__(self):
+        super().__init__()
+        self.keyboards: dict[int, InlineKeyboardMarkup] = {}
+
+    async def make_request(self, bot, method, timeout=None):
+        markup = getattr(method, "reply_markup", None)
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None and isinstance(markup, InlineKeyboardMarkup):
+            self.keyboards[chat_id] = markup
+        response = await super().make_request(bot, method, timeout)
+        # Список вызовов нужен только бенчмарку вебхука, здесь он лишь растет
+        self.calls.clear()
+        return response
+
+
+class SyntheticUser:
+    """Отправитель обновлений от имени одного пользователя"""
+
+    _update_ids = itertools.count(1)
+    _message_ids = itertools.count(1)
+
+    def __init__(self, bot: Bot, dp: Dispatcher, user_id: int, username: str):
+        self.bot = bot
+        self.dp = dp
+        self.user = {"id": user_id, "is_bot": False, "first_name": username, "username": username}
+        self.chat = {"id": user_id, "type": "private"}
+        self.latencies: list[float] = []
+
+    async def _feed(self, payload: dict):
+        update = Update.model_validate(payload, context={"bot": self.bot})
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.latencies.append(time.perf_counter() - started)
+
+    def message_update(self, text: str) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": self.chat,
+            "from": self.user,
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": next(self._update_ids), "message": message}
+
+    def callback_update(self, data: str) -> dict:
+        return {"update_id": next(self._update_ids), "callback_query": {
+            "id": str(next(self._message_ids)),
+            "from": self.user,
+            "chat_instance": str(self.chat["id"]),
+            "data": data,
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": self.chat,
+                "from": {"id": 123456, "is_bot": True, "first_name": "Bench"},
+                "text": "...",
+            },
+        }}
+
+    async def send(self, text: str):
+        await self._feed(self.message_update(text))
+
+    async def press(self, data: str):
+        await self._feed(self.callback_update(data))
+
+    def buttons(self, prefix: str) -> list[str]:
+        """callback_data кнопок последней клавиатуры в чате, начинающихся с prefix"""
+        markup = self.bot.session.keyboards.get(self.chat["id"])
+        if markup is None:
+            return []
+        return [b.callback_data for row in markup.inline_keyboard for b in row if (b.callback_data or "").startswith(prefix)]
+
+
+# --- Сценарии ---
+
+def resident_steps(index: int) -> list[tuple[str, str]]:
+    """Шаги жителя без обратной связи от бота: ("send", текст) или ("press", callback_data)"""
+    callback, problem = PROBLEMS[index % len(PROBLEMS)]
+    steps = [
+        ("send", "/start"),
+        ("send", "✍️ Сообщить о проблеме"),
+        ("press", f"queue_{index % 2 + 1}"),
+        ("send", str(index % 12 + 1)),
+        ("press", "floor_specify"),
+        ("send", str(index // 12 % 25 + 1)),
+        ("press", callback),
+    ]
+    if callback == 'problem_other':
+        steps.append(("send", f"Шумят соседи сверху, квартира {index}"))
+    steps.append(("press", "skip_ticket_photo"))
+    return steps
+
+
+async def resident_flow(user: SyntheticUser, index: int) -> bool:
+    for kind, value in resident_steps(index):
+        await (user.send(value) if kind == "send" else user.press(value))
+    return True
+
+
+async def specialist_flow(user: SyntheticUser, index: int) -> bool:
+    """Берет заявку в работу и выполняет ее; False, если свободных заявок не нашлось"""
+    await user.send("🔄 Изменить статус заявки")
+    tickets = user.buttons("ticket_")
+    if not tickets:
+        return False
+    # Специалисты одного направления видят одну страницу - разводим их по кнопкам
+    ticket = tickets[index // len(PROBLEMS) % len(tickets)]
+    await user.press(ticket)
+    await user.press("status_in_progress")
+    await user.send("2")
+
+    await user.send("🔄 Изменить статус заявки")
+    if ticket not in user.buttons("ticket_"):
+        return False
+    await user.press(ticket)
+    await user.press("status_completed")
+    await user.press("skip_comment")
+    await user.press("skip_completion_photo")
+    return True
+
+
+# --- Прогон и отчет ---
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _sql_totals() -> tuple[float, float]:
+    import metrics
+    queries = sum(metrics.db_queries_total._values.values())
+    seconds = sum(series[1] for series in metrics.db_query_seconds._series.values())
+    return queries, seconds
+
+
+async def run_flow(name: str, flow, users: list[SyntheticUser], concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    flow_latencies: list[float] = []
+    completed = skipped = errors = 0
+    first_error = None
+
+    async def run_one(index: int, user: SyntheticUser):
+        nonlocal completed, skipped, errors, first_error
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if await flow(user, index):
+                    completed += 1
+                    flow_latencies.append(time.perf_counter() - started)
+                else:
+                    skipped += 1
+            except Exception as e:
+                errors += 1
+                first_error = first_error or f"{type(e).__name__}: {e}"
+
+    queries_before, sql_seconds_before = _sql_totals()
+    started = time.perf_counter()
+    await asyncio.gather(*(run_one(i, u) for i, u in enumerate(users)))
+    elapsed = time.perf_counter() - started
+    queries_after, sql_seconds_after = _sql_totals()
+
+    steps = [latency for user in users for latency in user.latencies]
+    flows = max(1, completed + skipped)
+    return {
+        "flows": completed,
+        "skipped": skipped,
+        "errors": errors,
+        "updates": len(steps),
+        "seconds": round(elapsed, 3),
+        "updates_per_s": round(len(steps) / elapsed, 1),
+        "flows_per_s": round(completed / elapsed, 1),
+        "step_p50_ms": round(_percentile(steps, 0.5) * 1000, 2),
+        "step_p99_ms": round(_percentile(steps, 0.99) * 1000, 2),
+        "flow_p50_ms": round(_percentile(flow_latencies, 0.5) * 1000, 2),
+        "flow_p99_ms": round(_percentile(flow_latencies, 0.99) * 1000, 2),
+        "sql_per_flow": round((queries_after - queries_before) / flows, 1),
+        "sql_ms_per_flow": round((sql_seconds_after - sql_seconds_before) / flows * 1000, 2),
+        "first_error": first_error,
+    }
+
+
+def print_report(results: dict, previous: dict | None):
+    print(
+        f"{'сценарий':11} {'готово':>7} {'пропуск':>7} {'ошибок':>6} {'обн./с':>8} "
+        f"{'шаг p50':>8} {'шаг p99':>8} {'сцен. p50':>9} {'сцен. p99':>9} {'SQL/сцен.':>9}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:11} {r['flows']:7} {r['skipped']:7} {r['errors']:6} {r['updates_per_s']:8.0f} "
+            f"{r['step_p50_ms']:8.2f} {r['step_p99_ms']:8.2f} {r['flow_p50_ms']:9.1f} {r['flow_p99_ms']:9.1f} "
+            f"{r['sql_per_flow']:9.1f}"
+        )
+        if r["first_error"]:
+            print(f"  первая ошибка: {r['first_error']}")
+    if previous is None:
+        return
+    print(f"\nСравнение с прогоном {previous['timestamp']} ({previous.get('commit') or 'без коммита'}):")
+    for name, r in results.items():
+        old = previous["results"].get(name)
+        if not old:
+            continue
+        changes = []
+        for key, label in (("updates_per_s", "обн./с"), ("step_p99_ms", "шаг p99"), ("flow_p99_ms", "сцен. p99"), ("sql_per_flow", "SQL/сцен.")):
+            if old[key]:
+                changes.append(f"{label} {(r[key] - old[key]) / old[key] * 100:+.0f}%")
+        print(f"  {name:11} " + ", ".join(changes))
+
+
+def load_previous(path: str, params: dict) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("params") == params:
+                previous = record
+    return previous
+
+
+def current_commit() -> str | None:
+    with contextlib.suppress(Exception):
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--residents", type=int, default=2000)
+    parser.add_argument("--specialists", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=500, help="одновременно идущих сценариев")
+    parser.add_argument("--storage", choices=("sql", "memory"), default="sql", help="FSM-хранилище")
+    parser.add_argument("--url", help="база для теста; по умолчанию SQLite во временном каталоге")
+    # По умолчанию история вне репозитория, чтобы прогоны не попадали в коммиты
+    parser.add_argument(
+        "--results",
+        default=os.getenv("BENCH_RESULTS", os.path.join(tempfile.gettempdir(), "bench_results", "load.jsonl")),
+        help="файл истории прогонов (по умолчанию $BENCH_RESULTS или <tmp>/bench_results/load.jsonl)",
+    )
+    args = parser.parse_args()
+
+    import concurrency
+    import database as db
+    import metrics
+    import notifications
+    from fsm_storage import SqlStorage
+    from handlers import router
+
+    url = args.url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(prefix='estatemng-load-'), 'load.db')}"
+    db.configure_engine(url, echo=False)
+    await db.create_db_and_tables()
+
+    # Специалисты по всем типам проблем, заранее известные боту
+    for j in range(args.specialists):
+        username = f"specialist{j}"
+        await db.upsert_user(SPECIALIST_BASE_ID + j, username, f"Specialist {j}", role='specialist')
+        await db.add_specialist_for_problem(PROBLEMS[j % len(PROBLEMS)][1], username)
+
+    storage = SqlStorage(flush_interval=1.0) if args.storage == "sql" else MemoryStorage()
+    bot = Bot(token=BENCH_TOKEN, session=LoadSession())
+    dp = Dispatcher(storage=metrics.TimedStorage(storage), events_isolation=concurrency.KeyedEventIsolation())
+    dp.include_router(router)
+    metrics.setup(dp, bot, engines={db.engine, db.read_engine})
+    concurrency.setup(dp)
+    # Уведомления специалистам уходят в очередь; отправка ограничена лимитами
+    # Telegram и в замер не входит, поэтому воркеры не запускаются
+    notifications.dispatcher._queue = asyncio.Queue()
+
+    residents = [SyntheticUser(bot, dp, RESIDENT_BASE_ID + i, f"resident{i}") for i in range(args.residents)]
+    specialists = [SyntheticUser(bot, dp, SPECIALIST_BASE_ID + j, f"specialist{j}") for j in range(args.specialists)]
+    results = {
+        "resident": await run_flow("resident", resident_flow, residents, args.concurrency),
+        "specialist": await run_flow("specialist", specialist_flow, specialists, args.concurrency),
+    }
+
+    params = {
+        "residents": args.residents,
+        "specialists": args.specialists,
+        "concurrency": args.concurrency,
+        "storage": args.storage,
+        "backend": db.engine.dialect.name,
+    }
+    print_report(results, load_previous(args.results, params))
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": current_commit(),
+        "params": params,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"\nРезультат записан в {args.results}")
+
+    await dp.storage.close()
+    await bot.session.close()
+    await db.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""Микробенчмарк рендеринга: сборка текста и клавиатур в хэндлере против rendering.py.
+
+Для каждого сценария печатает время одного рендера и пик выделенной памяти
+(tracemalloc) для варианта, собиравшегося заново на каждый запрос, и для
+шаблонов/кэшей из rendering.py. Результаты обоих вариантов сравниваются,
+чтобы бенчмарк заодно проверял, что вывод не изменился.
+
+Запуск: python bench_rendering.py --repeat 20000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import keyboards as kb
+import rendering
+
+
+def make_tickets(count: int) -> list:
+    now = datetime(2026, 10, 1, 12, 0)
+    specialist = SimpleNamespace(username="plumber")
+    tickets = []
+    for i in range(count):
+        taken = i % 3 != 0
+        tickets.append(SimpleNamespace(
+            id=1000 + i,
+            problem_type="Проблема с водой" if i % 2 else "Не работает лифт",
+            status="Взята в работу" if taken else "Новая",
+            created_at=now - timedelta(hours=i),
+            taken_at=now if taken else None,
+            estimated_days=2 if taken else None,
+            completed_at=None,
+            responsible_specialist_id=77 if taken else None,
+            responsible_specialist=specialist if taken else None,
+        ))
+    return tickets
+
+
+# --- Как было: сборка в хэндлере на каждый запрос ---
+
+def legacy_welcome(role: str):
+    role_to_menu = {
+        'resident': kb.resident_menu,
+        'specialist': kb.specialist_menu,
+        'manager': kb.manager_menu,
+    }
+    text = (
+        f"Здравствуйте! 👋\n\n"
+        f"Ваша роль: <b>{role}</b>\n\n"
+        f"Я чат-бот вашей Управляющей Компании. "
+        f"Готов помочь вам с решением бытовых вопросов."
+    )
+    return text, role_to_menu.get(role, kb.resident_menu)
+
+
+def legacy_tickets_keyboard(tickets, next_cursor):
+    keyboard_buttons = []
+    for t in tickets:
+        keyboard_buttons.append([InlineKeyboardButton(
+            text=f"#{t.id} • {t.problem_type} • {t.status}",
+            callback_data=f"ticket_{t.id}"
+        )])
+    if next_cursor:
+        keyboard_buttons.append([InlineKeyboardButton(
+            text="Следующие заявки", callback_data=f"tickets_next_{next_cursor}"
+        )])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+
+def legacy_all_tickets(tickets):
+    parts = ["Все заявки в системе:"]
+    for t in tickets:
+        responsible = ""
+        if t.responsible_specialist_id:
+            responsible_user = t.responsible_specialist
+            responsible_username = responsible_user.username if responsible_user else f"ID:{t.responsible_specialist_id}"
+            responsible = f"\n<b>Ответственный:</b> @{responsible_username}"
+        details = (
+            f"<b>#{t.id}</b> • {t.problem_type} • {t.status}\n"
+            f"<b>Создана:</b> {t.created_at.strftime('%d.%m.%Y %H:%M')}"
+        )
+        if getattr(t, 'taken_at', None):
+            details += f"\n<b>Взята в работу:</b> {t.taken_at.strftime('%d.%m.%Y %H:%M')}"
+        if getattr(t, 'estimated_days', None) is not None:
+            days_text = f"{t.estimated_days} дней" if t.estimated_days and t.estimated_days > 0 else "неизвестно"
+            details += f"\n<b>Срок выполнения:</b> {days_text}"
+        if getattr(t, 'completed_at', None):
+            details += f"\n<b>Выполнена:</b> {t.completed_at.strftime('%d.%m.%Y %H:%M')}"
+        details += responsible
+        parts.append(details)
+    return "\n\n".join(parts)
+
+
+# --- Как стало ---
+
+def cached_welcome(role: str):
+    return rendering.welcome_text(role), rendering.menu_for_role(role)
+
+
+def cached_tickets_keyboard(tickets, next_cursor):
+    return rendering.tickets_page_keyboard(rendering.ticket_summaries(tickets), next_cursor)
+
+
+def cached_all_tickets(tickets):
+    return "\n\n".join(["Все заявки в системе:"] + [
+        rendering.all_tickets_entry(
+            t.id, t.problem_type, t.status, t.created_at, t.taken_at, t.estimated_days, t.completed_at,
+            rendering.responsible_name(t),
+        )
+        for t in tickets
+    ])
+
+
+def measure(fn, repeat: int) -> tuple[float, int]:
+    """(мкс на вызов, пик выделенной памяти за один вызов в байтах)"""
+    fn()  # прогрев кэшей
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    per_call = (time.perf_counter() - started) / repeat * 1e6
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return per_call, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    page10 = make_tickets(10)
+    page20 = make_tickets(20)
+    scenarios = [
+        ("приветствие", lambda: legacy_welcome("specialist"), lambda: cached_welcome("specialist")),
+        ("клавиатура 10 заявок", lambda: legacy_tickets_keyboard(page10, "cursor"), lambda: cached_tickets_keyboard(page10, "cursor")),
+        ("все заявки, 20 шт.", lambda: legacy_all_tickets(page20), lambda: cached_all_tickets(page20)),
+    ]
+    print(f"{'сценарий':24} {'было, мкс':>10} {'стало, мкс':>11} {'было, байт':>11} {'стало, байт':>12}")
+    for name, legacy, cached in scenarios:
+        assert legacy() == cached(), f"вывод отличается: {name}"
+        legacy_time, legacy_peak = measure(legacy, args.repeat)
+        cached_time, cached_peak = measure(cached, args.repeat)
+        print(f"{name:24} {legacy_time:10.2f} {cached_time:11.2f} {legacy_peak:11} {cached_peak:12}")
+
+
+if __name__ == "__main__":
+    main()
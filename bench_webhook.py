@@ -0,0 +1,185 @@
+"""Сравнение пропускной способности вебхука и long polling.
+
+Бот работает с настоящими хэндлерами и отдельной базой во временном каталоге,
+а вместо Telegram API используется RecordingSession, которая запоминает
+исходящие запросы и сразу отвечает. Вебхук получает обновления POST-запросами
+через aiohttp, polling - через подмененный getUpdates.
+
+Запуск: python bench_webhook.py --updates 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, GetUpdates, TelegramMethod
+from aiogram.types import Chat, Message, Update, User
+from aiohttp import ClientSession, web
+
+BENCH_TOKEN = "123456:BENCHMARK"
+SECRET = "bench-secret"
+
+
+class RecordingSession(BaseSession):
+    """Сессия бота без сети: записывает вызовы API и возвращает правдоподобные ответы"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: list[TelegramMethod] = []
+        self.updates: asyncio.Queue[Update] = asyncio.Queue()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, GetUpdates):
+            # Отдаем накопленные обновления пачкой, как настоящий getUpdates
+            batch = [await self.updates.get()]
+            while not self.updates.empty() and len(batch) < (method.limit or 100):
+                batch.append(self.updates.get_nowait())
+            return batch
+        if isinstance(method, GetMe):
+            return User(id=123456, is_bot=True, first_name="Bench", username="bench_bot")
+        self.calls.append(method)
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def make_start_update(update_id: int) -> dict:
+    user_id = 1_000_000 + update_id
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"Resident {update_id}", "username": f"resident{update_id}"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+class UpdateCounter:
+    """Outer-middleware: считает обработанные обновления, в том числе упавшие"""
+
+    def __init__(self):
+        self.handled = 0
+        self.errors = 0
+        self.expected = 0
+        self.done = asyncio.Event()
+
+    def reset(self, expected: int):
+        self.handled = self.errors = 0
+        self.expected = expected
+        self.done = asyncio.Event()
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.handled += 1
+            if self.handled >= self.expected:
+                self.done.set()
+
+
+def build_bot() -> tuple[Bot, Dispatcher, UpdateCounter]:
+    from handlers import router
+
+    bot = Bot(token=BENCH_TOKEN, session=RecordingSession())
+    dp = Dispatcher()
+    dp.include_router(router)
+    counter = UpdateCounter()
+    dp.update.outer_middleware(counter)
+    return bot, dp, counter
+
+
+async def bench_webhook(bot: Bot, dp: Dispatcher, counter: UpdateCounter, updates: list[dict], concurrency: int) -> float:
+    from webhook import build_webhook_app
+
+    counter.reset(len(updates))
+    runner = web.AppRunner(build_webhook_app(dp, bot, "/webhook", SECRET))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/webhook"
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    async with ClientSession() as client:
+        async def post(update):
+            async with semaphore:
+                async with client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as response:
+                    assert response.status == 200, response.status
+
+        await asyncio.gather(*(post(u) for u in updates))
+        await counter.done.wait()
+    elapsed = time.perf_counter() - started
+    await runner.cleanup()
+    return elapsed
+
+
+async def bench_polling(bot: Bot, dp: Dispatcher, counter: UpdateCounter, updates: list[dict]) -> float:
+    counter.reset(len(updates))
+    for update in updates:
+        bot.session.updates.put_nowait(Update.model_validate(update, context={"bot": bot}))
+
+    started = time.perf_counter()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False))
+    await counter.done.wait()
+    elapsed = time.perf_counter() - started
+    await dp.stop_polling()
+    bot.session.updates.put_nowait(Update(update_id=0))  # разбудить getUpdates
+    await polling
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    import database as db
+    db_path = os.path.join(tempfile.mkdtemp(prefix="estatemng-bench-"), "bench.db")
+    db.configure_engine(f"sqlite+aiosqlite:///{db_path}", echo=False)
+    await db.create_db_and_tables()
+
+    bot, dp, counter = build_bot()
+    first = 1
+    for name in ("polling", "webhook"):
+        updates = [make_start_update(i) for i in range(first, first + args.updates)]
+        first += args.updates
+        if name == "webhook":
+            elapsed = await bench_webhook(bot, dp, counter, updates, args.concurrency)
+        else:
+            elapsed = await bench_polling(bot, dp, counter, updates)
+        print(
+            f"{name:8} {args.updates} обновлений за {elapsed:.2f} с - "
+            f"{args.updates / elapsed:.0f} обн./с, ошибок: {counter.errors}"
+        )
+    await db.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
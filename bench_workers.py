@@ -0,0 +1,94 @@
+"""Масштабирование по процессам: один прием обновлений и 1..N воркеров из workers.py.
+
+Процесс бенчмарка играет роль приема: раскладывает обновления сценария
+жителя (как в bench_load.py) по воркерам через WorkerPool.dispatch. Воркеры
+запускают настоящий диспетчер из bot.build_dispatcher, но с RecordingSession
+вместо Telegram API. Для каждого числа воркеров создается новая база,
+время считается от первого отправленного обновления до завершения всех
+воркеров (старт процессов в замер не входит).
+
+Ускорение ограничено числом ядер: на машине с одним ядром воркеры только
+делят его между собой. С SQLite все процессы пишут в один файл, поэтому
+для замеров на многоядерной машине лучше PostgreSQL (--url).
+
+Запуск: python bench_workers.py --residents 2000 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from bench_load import SyntheticUser, resident_steps, RESIDENT_BASE_ID
+from bench_webhook import BENCH_TOKEN, RecordingSession
+
+
+def make_bench_bot():
+    """Фабрика бота для воркеров: вызывается в дочернем процессе"""
+    from aiogram import Bot
+    return Bot(token=BENCH_TOKEN, session=RecordingSession())
+
+
+def build_updates(residents: int) -> list[tuple[int, str]]:
+    """Обновления всех жителей вперемешку, по шагу каждого: (chat_id, JSON)"""
+    users = [SyntheticUser(None, None, RESIDENT_BASE_ID + i, f"resident{i}") for i in range(residents)]
+    flows = [
+        [user.message_update(value) if kind == "send" else user.callback_update(value) for kind, value in resident_steps(i)]
+        for i, user in enumerate(users)
+    ]
+    updates = []
+    for step in range(max(len(flow) for flow in flows)):
+        for user, flow in zip(users, flows):
+            if step < len(flow):
+                updates.append((user.chat["id"], json.dumps(flow[step], ensure_ascii=False)))
+    return updates
+
+
+async def bench(workers: int, residents: int, url: str | None) -> tuple[float, int, list[dict]]:
+    import database as db
+    from workers import WorkerPool
+
+    url = url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(prefix='estatemng-workers-'), 'bench.db')}"
+    # Воркеры читают настройки из окружения при импорте database
+    os.environ["DATABASE_URL"] = url
+    db.configure_engine(url, echo=False)
+    await db.create_db_and_tables()
+    await db.close_db()
+
+    updates = build_updates(residents)
+    pool = WorkerPool(workers, bot_factory=make_bench_bot)
+    pool.start()
+    await pool.wait_ready()
+    started = time.perf_counter()
+    for chat_id, update_json in updates:
+        pool.dispatch(update_json, chat_id)
+    results = await pool.stop()
+    return time.perf_counter() - started, len(updates), results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--residents", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--url", help="общая база воркеров; по умолчанию новый файл SQLite на каждый прогон")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("CACHE_REFRESH_INTERVAL", "3600")
+    print(f"Ядер: {os.cpu_count()}, жителей: {args.residents}")
+    print(f"{'воркеров':>8} {'обновлений':>10} {'время, с':>9} {'обн./с':>8} {'ускорение':>9} {'эффект.':>7}  по воркерам")
+    baseline = None
+    for workers in args.workers:
+        elapsed, count, results = await bench(workers, args.residents, args.url)
+        rate = count / elapsed
+        # Ускорение и эффективность - относительно первого прогона в списке --workers
+        baseline = baseline or rate
+        speedup = rate / baseline
+        efficiency = speedup / (workers / args.workers[0])
+        per_worker = " ".join(str(r["handled"]) for r in sorted(results, key=lambda r: r["worker"]))
+        print(f"{workers:8} {count:10} {elapsed:9.2f} {rate:8.0f} {speedup:8.2f}x {efficiency:7.0%}  {per_worker}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,34 +6,151 @@ from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher
 from aiogram.enums.parse_mode import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.fsm.storage.memory import MemoryStorage
+
+# Загружаем переменные окружения из .env файла до импорта модулей бота:
+# database и notifications читают настройки при импорте
+load_dotenv()
 
 from handlers import router
 from database import create_db_and_tables
+from fsm_storage import SqlStorage
 import database as db
+import concurrency
+import dedup
+import metrics
+import notifications
+import routing
+import scheduler
+import workers
+from webhook import run_webhook
 
-# Загружаем переменные окружения из .env файла
-load_dotenv()
+# Включаем логирование; SQL-запросы в лог пишутся только при DB_ECHO=true
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 
-# Включаем логирование
-logging.basicConfig(level=logging.INFO)
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
 
-# Основная асинхронная функция
-async def main():
-    # Проверяем и создаем таблицы в БД при запуске
-    await create_db_and_tables()
 
-    # Инициализация бота и диспетчера
-    bot = Bot(
+def _queue_metrics() -> list[str]:
+    """Глубина очередей и счетчики рассылки для /metrics"""
+    queues = {(('queue', 'notifications'),): notifications.dispatcher._queue.qsize() if notifications.dispatcher._queue else 0}
+    if db.writer is not None:
+        queues[(('queue', 'db_writer'),)] = db.writer._queue.qsize() if db.writer._queue else 0
+    lines = metrics.gauge_lines("bot_queue_size", "Задачи, ожидающие в очереди", queues)
+    lines += metrics.gauge_lines(
+        "bot_notifications", "Счетчики очереди уведомлений с момента запуска",
+        {(('event', name),): value for name, value in notifications.dispatcher.stats.items()},
+    )
+    return lines
+
+
+metrics.registry.add_collector(_queue_metrics)
+
+_background_tasks: list[asyncio.Task] = []
+
+
+async def on_startup(bot: Bot, worker_index: int = 0, workers: int = 1):
+    if workers > 1:
+        # Лимит Telegram общий для бота: делим его между процессами
+        rate = notifications.dispatcher.global_bucket.rate / workers
+        notifications.dispatcher.global_bucket = notifications.TokenBucket(rate)
+    await notifications.dispatcher.start(bot)
+    # Индекс открытых заявок для поиска дубликатов
+    await dedup.index.warm()
+    # Специалисты по типам проблем для рассылки о новых заявках
+    await routing.table.load()
+    # Напоминания и эскалации по срокам заявок - в одном процессе, иначе они задвоятся
+    if worker_index == 0:
+        await scheduler.deadlines.start()
+    if workers > 1:
+        # Заявки и назначения из других воркеров попадают в кэши при перечитывании
+        interval = float(os.getenv("CACHE_REFRESH_INTERVAL", "30"))
+        _background_tasks.append(asyncio.create_task(_refresh_caches(interval)))
+        # Роль или username, измененные в другом воркере, этот процесс увидит только
+        # после истечения записи кэша пользователей: держим ее недолго
+        db.user_cache.ttl = min(db.user_cache.ttl, float(os.getenv("USER_CACHE_TTL_WORKERS", "5")))
+    # METRICS_PORT поднимает отдельный сервер /metrics (в режиме вебхука /metrics
+    # отдает основной сервер, воркер i слушает METRICS_PORT + i),
+    # METRICS_LOG_INTERVAL - периодическая сводка в лог
+    metrics_port = os.getenv("METRICS_PORT")
+    if metrics_port and (workers > 1 or os.getenv("BOT_MODE", "polling") != "webhook"):
+        runner = await metrics.start_metrics_server(
+            os.getenv("METRICS_HOST", "0.0.0.0"), int(metrics_port) + worker_index, os.getenv("METRICS_PATH", "/metrics"),
+        )
+        _background_tasks.append(asyncio.create_task(_serve_until_cancelled(runner)))
+    log_interval = float(os.getenv("METRICS_LOG_INTERVAL", "0"))
+    if log_interval > 0:
+        _background_tasks.append(asyncio.create_task(metrics.log_periodically(log_interval)))
+
+
+async def _refresh_caches(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await dedup.index.warm()
+            await routing.table.load()
+        except Exception:
+            logging.exception("Ошибка обновления кэшей")
+
+
+async def _serve_until_cancelled(runner):
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def on_shutdown():
+    # Выполняется до закрытия сессии бота, поэтому очередь успевает отправиться
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    await scheduler.deadlines.stop()
+    await notifications.dispatcher.stop()
+    await db.close_db()
+
+
+def build_bot() -> Bot:
+    return Bot(
         token=os.getenv("BOT_TOKEN"),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher()
+
+
+def build_dispatcher(bot: Bot, **workflow_data) -> Dispatcher:
+    """Диспетчер с хэндлерами, FSM-хранилищем и метриками; workflow_data попадает в on_startup"""
+    # Состояния FSM храним в базе, чтобы незавершенные заявки переживали перезапуск.
+    # FSM_STORAGE=memory возвращает хранилище aiogram в памяти.
+    if os.getenv("FSM_STORAGE", "sql") == "sql":
+        storage = SqlStorage(flush_interval=float(os.getenv("FSM_FLUSH_INTERVAL", "1")))
+    else:
+        storage = MemoryStorage()
+    # Обновления одного чата - по очереди: aiogram берет блокировку до чтения
+    # состояния FSM, поэтому следующее обновление видит результат предыдущего
+    dp = Dispatcher(storage=metrics.TimedStorage(storage), events_isolation=concurrency.KeyedEventIsolation(), **workflow_data)
 
     # Подключаем роутер с хэндлерами
     dp.include_router(router)
-    
-    # Удаляем вебхук, если он был установлен ранее
-    await bot.delete_webhook(drop_pending_updates=True)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    # Латентность хэндлеров, SQL, Telegram API и FSM
+    metrics.setup(dp, bot, engines={db.engine, db.read_engine})
+    # Повторные доставки обновления и повторные нажатия кнопки - один раз
+    concurrency.setup(dp, callback_ttl=float(os.getenv("CALLBACK_DEDUP_TTL", "3")))
+    return dp
+
+
+# Основная асинхронная функция
+async def main():
+    # Проверяем и создаем таблицы в БД при запуске
+    await create_db_and_tables()
+
+    # Инициализация бота
+    bot = build_bot()
+
     # Проставим роли модераторов из .env, если их еще нет
     moderators = os.getenv("MODERATORS", "")
     if moderators:
@@ -44,8 +161,47 @@ async def main():
             except Exception:
                 pass
 
-    # Запускаем бота
-    await dp.start_polling(bot)
+    # DROP_PENDING_UPDATES=false сохраняет обновления, накопившиеся за время перезапуска
+    drop_pending_updates = _env_flag("DROP_PENDING_UPDATES", "true")
+
+    # WORKERS=N: этот процесс только принимает обновления, обрабатывают их N процессов
+    worker_count = int(os.getenv("WORKERS", "1"))
+    if worker_count > 1:
+        await db.close_db()
+        await workers.run(
+            worker_count,
+            bot,
+            allowed_updates=router.resolve_used_update_types(),
+            mode=os.getenv("BOT_MODE", "polling"),
+            drop_pending_updates=drop_pending_updates,
+            url=os.getenv("WEBHOOK_URL"),
+            path=os.getenv("WEBHOOK_PATH", "/webhook"),
+            host=os.getenv("WEBAPP_HOST", "0.0.0.0"),
+            port=int(os.getenv("WEBAPP_PORT", "8080")),
+            secret_token=os.getenv("WEBHOOK_SECRET"),
+        )
+        return
+
+    dp = build_dispatcher(bot)
+
+    # Запускаем бота: BOT_MODE=webhook принимает обновления через aiohttp-сервер
+    if os.getenv("BOT_MODE", "polling") == "webhook":
+        await run_webhook(
+            dp,
+            bot,
+            url=os.getenv("WEBHOOK_URL"),
+            path=os.getenv("WEBHOOK_PATH", "/webhook"),
+            host=os.getenv("WEBAPP_HOST", "0.0.0.0"),
+            port=int(os.getenv("WEBAPP_PORT", "8080")),
+            secret_token=os.getenv("WEBHOOK_SECRET"),
+            drop_pending_updates=drop_pending_updates,
+            drain_timeout=float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30")),
+            metrics_path=os.getenv("METRICS_PATH", "/metrics"),
+        )
+    else:
+        # Удаляем вебхук, если он был установлен ранее
+        await bot.delete_webhook(drop_pending_updates=drop_pending_updates)
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
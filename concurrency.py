@@ -0,0 +1,137 @@
+"""Порядок обработки обновлений внутри чата и защита от повторных нажатий.
+
+aiogram обрабатывает обновления параллельно, поэтому два быстрых нажатия
+одной кнопки могли выполниться одновременно: создать две заявки или дважды
+сменить статус. Обновления одного чата идут строго друг за другом благодаря
+KeyedEventIsolation в Dispatcher (см. bot.build_dispatcher): aiogram берет
+блокировку ключа FSM до чтения состояния, поэтому следующее обновление видит
+состояние, оставленное предыдущим. Блокировки неактивных чатов удаляются,
+а время ожидания блокировки пишется в metrics.chat_lock_wait_seconds - оно
+не входит во время обработки обновления. Разные чаты по-прежнему
+обрабатываются параллельно. UpdateDeduplicationMiddleware пропускает повторную доставку
+того же update_id, CallbackIdempotencyMiddleware отбрасывает повторное
+нажатие той же кнопки того же сообщения в течение ttl.
+"""
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import CallbackQuery
+
+import metrics
+
+
+class KeyedLocks:
+    """asyncio.Lock на ключ; блокировка удаляется, когда ее никто не держит и не ждет"""
+
+    def __init__(self):
+        self._locks: weakref.WeakValueDictionary[Any, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    def lock(self, key) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class KeyedEventIsolation(BaseEventIsolation):
+    """Изоляция событий aiogram по ключу FSM на KeyedLocks.
+
+    В отличие от SimpleEventIsolation не копит блокировки всех когда-либо
+    писавших чатов: блокировка живет, пока её держат или ждут.
+    """
+
+    def __init__(self):
+        self._locks = KeyedLocks()
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        started = time.perf_counter()
+        async with self._locks.lock(key):
+            metrics.chat_lock_wait_seconds.observe(time.perf_counter() - started)
+            yield
+
+    async def close(self) -> None:
+        pass
+
+
+class ExpiringKeys:
+    """Множество ключей со сроком жизни и ограничением размера"""
+
+    def __init__(self, ttl: float, maxsize: int = 100000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._expires: OrderedDict[Any, float] = OrderedDict()
+
+    def add(self, key) -> bool:
+        """Запоминает ключ; False, если он уже был и еще не истек"""
+        now = time.monotonic()
+        # Ключи добавляются с одинаковым ttl, поэтому истекшие всегда в начале
+        while self._expires and next(iter(self._expires.values())) < now:
+            self._expires.popitem(last=False)
+        if key in self._expires:
+            return False
+        self._expires[key] = now + self.ttl
+        while len(self._expires) > self.maxsize:
+            self._expires.popitem(last=False)
+        return True
+
+    def discard(self, key):
+        self._expires.pop(key, None)
+
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: повторы update_id пропускаются"""
+
+    def __init__(self, update_ttl: float = 600.0):
+        # Telegram повторяет доставку вебхука, если не дождался ответа
+        self.seen_updates = ExpiringKeys(update_ttl)
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not self.seen_updates.add(event.update_id):
+            return None
+        return await handler(event, data)
+
+
+class CallbackIdempotencyMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.callback_query: повторное нажатие в течение ttl только гасит часики"""
+
+    def __init__(self, ttl: float = 3.0):
+        self.pressed = ExpiringKeys(ttl)
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        message_id = event.message.message_id if event.message else event.inline_message_id
+        key = (event.from_user.id, message_id, event.data)
+        if not self.pressed.add(key):
+            await event.answer()
+            return None
+        try:
+            return await handler(event, data)
+        except Exception:
+            # Нажатие не обработалось - пусть повторное нажатие попробует снова
+            self.pressed.discard(key)
+            raise
+
+
+def setup(dp, callback_ttl: float = 3.0):
+    """Подключает защиту от повторов; порядок внутри чата дает Dispatcher(events_isolation=KeyedEventIsolation())"""
+    dp.update.outer_middleware(UpdateDeduplicationMiddleware())
+    dp.callback_query.outer_middleware(CallbackIdempotencyMiddleware(callback_ttl))
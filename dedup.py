@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+import database as db
+from concurrency import KeyedLocks
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_description(text: str | None) -> str:
+    """Приводит описание к виду для сравнения: регистр, ё, пунктуация, пробелы"""
+    text = (text or '').lower().replace('ё', 'е')
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def ticket_key(location_queue, location_entrance, location_floor, problem_type, description) -> tuple:
+    """Ключ заявки: место + тип проблемы + нормализованное описание"""
+    return (
+        str(location_queue or ''),
+        str(location_entrance or ''),
+        str(location_floor or ''),
+        problem_type or '',
+        normalize_description(description),
+    )
+
+
+class DuplicateIndex:
+    """Индекс открытых заявок по ключу ticket_key для поиска дубликатов за O(1).
+
+    Хранит только заявки, созданные за последние window; при первом обращении
+    прогревается из базы. Закрытые заявки удаляются по событию из
+    db.ticket_status_listeners, а найденная заявка перед использованием
+    перепроверяется по базе, поэтому изменения из других процессов не приводят
+    к присоединению к уже закрытой заявке.
+    """
+
+    def __init__(self, window: timedelta = timedelta(hours=24)):
+        self.window = window
+        self._by_key: dict[tuple, tuple[int, datetime]] = {}
+        self._key_by_id: dict[int, tuple] = {}
+        self._warmed = False
+        self._warm_lock = asyncio.Lock()
+        self._locks = KeyedLocks()
+
+    async def warm(self):
+        """Загружает открытые заявки за окно window из базы"""
+        async with self._warm_lock:
+            tickets = await db.get_open_tickets_created_since(datetime.utcnow() - self.window)
+            self._by_key.clear()
+            self._key_by_id.clear()
+            for ticket in sorted(tickets, key=lambda t: t.created_at):
+                self.add(ticket)
+            self._warmed = True
+            logger.info("Индекс дубликатов: %s открытых заявок", len(self._key_by_id))
+
+    def add(self, ticket):
+        """Добавляет созданную заявку; более новая заявка с тем же ключом вытесняет старую"""
+        key = ticket_key(
+            ticket.location_queue, ticket.location_entrance, ticket.location_floor,
+            ticket.problem_type, ticket.description,
+        )
+        previous = self._by_key.get(key)
+        if previous is not None:
+            self._key_by_id.pop(previous[0], None)
+        self._by_key[key] = (ticket.id, ticket.created_at or datetime.utcnow())
+        self._key_by_id[ticket.id] = key
+
+    def discard(self, ticket_id: int):
+        """Убирает заявку из индекса (например, после закрытия)"""
+        key = self._key_by_id.pop(ticket_id, None)
+        if key is not None and self._by_key.get(key, (None,))[0] == ticket_id:
+            del self._by_key[key]
+
+    def on_status_changed(self, ticket):
+        """Обработчик db.ticket_status_listeners: закрытая заявка больше не собирает дубликаты"""
+        if ticket.status not in db.OPEN_STATUSES:
+            self.discard(ticket.id)
+
+    @staticmethod
+    def _data_key(data: dict) -> tuple:
+        return ticket_key(
+            data.get('location_queue'), data.get('location_entrance'), data.get('location_floor'),
+            data.get('problem_type'), data.get('description'),
+        )
+
+    def lock(self, data: dict) -> asyncio.Lock:
+        """Блокировка на ключ заявки: одновременные одинаковые заявки создадут одну запись"""
+        return self._locks.lock(self._data_key(data))
+
+    async def find(self, data: dict):
+        """Возвращает открытую заявку-дубликат для данных новой заявки или None"""
+        if not self._warmed:
+            await self.warm()
+        entry = self._by_key.get(self._data_key(data))
+        if entry is None:
+            return None
+        ticket_id, created_at = entry
+        if created_at < datetime.utcnow() - self.window:
+            self.discard(ticket_id)
+            return None
+        ticket = await db.get_ticket_by_id(ticket_id)
+        if ticket is None or ticket.status not in db.OPEN_STATUSES:
+            self.discard(ticket_id)
+            return None
+        return ticket
+
+
+index = DuplicateIndex(window=timedelta(hours=float(os.getenv("DEDUP_WINDOW_HOURS", "24"))))
+db.ticket_status_listeners.append(index.on_status_changed)
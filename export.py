@@ -0,0 +1,105 @@
+import asyncio
+import csv
+import os
+import tempfile
+from datetime import datetime
+
+import database as db
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # XLSX необязателен: pip install openpyxl
+    Workbook = None
+
+# (заголовок, поле строки из db.stream_tickets)
+EXPORT_COLUMNS = [
+    ("Номер", 'id'),
+    ("Создана", 'created_at'),
+    ("Статус", 'status'),
+    ("Тип проблемы", 'problem_type'),
+    ("Описание", 'description'),
+    ("Очередь", 'location_queue'),
+    ("Подъезд", 'location_entrance'),
+    ("Этаж", 'location_floor'),
+    ("ID жителя", 'resident_id'),
+    ("Житель", 'resident_username'),
+    ("ФИО жителя", 'resident_full_name'),
+    ("ID ответственного", 'responsible_specialist_id'),
+    ("Ответственный", 'responsible_username'),
+    ("Взята в работу", 'taken_at'),
+    ("Срок, дней", 'estimated_days'),
+    ("Выполнена", 'completed_at'),
+    ("Комментарий специалиста", 'completion_comment'),
+]
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+
+def xlsx_available() -> bool:
+    return Workbook is not None
+
+
+# Текст, начинающийся с этих символов, Excel считает формулой (CSV/formula injection)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _safe_text(value):
+    """Экранирует апострофом текст жителя, который табличный редактор выполнил бы как формулу"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%d.%m.%Y %H:%M')
+    return '' if value is None else _safe_text(value)
+
+
+async def _write_csv(path: str, rows) -> int:
+    count = 0
+    # BOM и точка с запятой - чтобы файл корректно открывался в русском Excel
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow([title for title, _ in EXPORT_COLUMNS])
+        async for row in rows:
+            writer.writerow([_csv_value(getattr(row, field)) for _, field in EXPORT_COLUMNS])
+            count += 1
+    return count
+
+
+async def _write_xlsx(path: str, rows) -> int:
+    count = 0
+    # write_only-книга сразу сбрасывает строки во временный файл и не держит их в памяти
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Заявки")
+    sheet.append([title for title, _ in EXPORT_COLUMNS])
+    async for row in rows:
+        sheet.append([_safe_text(getattr(row, field)) for _, field in EXPORT_COLUMNS])
+        count += 1
+    await asyncio.to_thread(workbook.save, path)
+    return count
+
+
+async def export_tickets(fmt: str = 'csv', **filters) -> tuple[str, int]:
+    """Выгружает заявки в CSV или XLSX во временный файл: (путь, число строк).
+
+    filters передаются в db.stream_tickets. Удалить файл после отправки
+    должен вызывающий код.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+    if fmt == 'xlsx' and not xlsx_available():
+        raise RuntimeError("Для выгрузки в XLSX установите openpyxl")
+    fd, path = tempfile.mkstemp(prefix='tickets-', suffix=f'.{fmt}')
+    os.close(fd)
+    try:
+        rows = db.stream_tickets(**filters)
+        if fmt == 'xlsx':
+            count = await _write_xlsx(path, rows)
+        else:
+            count = await _write_csv(path, rows)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, count
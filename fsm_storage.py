@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import delete
+
+import database as db
+from concurrency import KeyedLocks
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    touched_at: float = field(default_factory=time.monotonic)
+
+
+def _key_to_str(key: StorageKey) -> str:
+    return ":".join(str(part) if part is not None else "" for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny,
+    ))
+
+
+class SqlStorage(BaseStorage):
+    """FSM-хранилище поверх движка SQLAlchemy из database.py.
+
+    Состояния держатся в памяти и сбрасываются в таблицу fsm_states пачкой
+    раз в flush_interval секунд, поэтому update_data не ходит в базу.
+    Незавершенные сценарии переживают перезапуск бота, а состояния,
+    не менявшиеся дольше ttl, удаляются. Записи, к которым не обращались
+    дольше cache_ttl, вытесняются из памяти. Несколько процессов могут
+    делить одну таблицу, если обновления одного чата обрабатывает один процесс.
+    """
+
+    def __init__(self, flush_interval: float = 1.0, ttl: float = 7 * 24 * 3600, cache_ttl: float = 3600):
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.cache_ttl = cache_ttl
+        self._records: dict[str, _Record] = {}
+        self._dirty: set[str] = set()
+        # Загрузка из базы - под блокировкой ключа: разные чаты не ждут друг друга
+        self._load_locks = KeyedLocks()
+        self._flush_task: asyncio.Task | None = None
+        self._last_expire = 0.0
+
+    async def _record(self, key: StorageKey) -> _Record:
+        str_key = _key_to_str(key)
+        record = self._records.get(str_key)
+        if record is not None:
+            record.touched_at = time.monotonic()
+            return record
+        async with self._load_locks.lock(str_key):
+            record = self._records.get(str_key)
+            if record is None:
+                async with db.ReadSession() as session:
+                    row = await session.get(db.FSMState, str_key)
+                record = _Record()
+                if row is not None:
+                    record.state = row.state
+                    record.data = json.loads(row.data) if row.data else {}
+                self._records[str_key] = record
+        return record
+
+    def _mark_dirty(self, key: StorageKey):
+        self._dirty.add(_key_to_str(key))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._record(key)
+        record.data = data.copy()
+        self._mark_dirty(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        rows = {}
+        for str_key in dirty:
+            record = self._records.get(str_key)
+            if record is not None and (record.state is not None or record.data):
+                rows[str_key] = (record.state, json.dumps(record.data, ensure_ascii=False))
+            else:
+                rows[str_key] = None
+        now = datetime.utcnow()
+
+        async def write(session):
+            for str_key, row in rows.items():
+                if row is None:
+                    await session.execute(delete(db.FSMState).where(db.FSMState.key == str_key))
+                else:
+                    state, data = row
+                    await session.merge(db.FSMState(key=str_key, state=state, data=data, updated_at=now))
+
+        try:
+            await db.run_write(write)
+        except Exception:
+            # Не теряем изменения: повторим при следующем сбросе
+            self._dirty |= dirty
+            raise
+
+    async def expire(self):
+        """Вытесняет давно неиспользуемые записи из памяти и удаляет из базы состояния старше ttl"""
+        idle_before = time.monotonic() - self.cache_ttl
+        for str_key in [k for k, r in self._records.items() if r.touched_at < idle_before and k not in self._dirty]:
+            del self._records[str_key]
+        expired_before = datetime.utcnow() - timedelta(seconds=self.ttl)
+
+        async def write(session):
+            await session.execute(delete(db.FSMState).where(db.FSMState.updated_at < expired_before))
+
+        await db.run_write(write)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_expire > 60:
+                    self._last_expire = time.monotonic()
+                    await self.expire()
+            except Exception:
+                logger.exception("Ошибка сохранения состояний FSM")
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
@@ -3,11 +3,19 @@ from aiogram.filters import Command
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, FSInputFile
+from datetime import datetime, timedelta
+import html
 import os
+import shlex
 
 import keyboards as kb
 import database as db
+import dedup
+import export
+import notifications
+import rendering
+import routing
 
 router = Router()
 
@@ -39,6 +47,9 @@ class StatusChangeState(StatesGroup):
     completion_comment = State()
     completion_photo = State()
 
+class ModBulkCloseState(StatesGroup):
+    confirm = State()  # Фильтры и статус в данных состояния, ждем подтверждения
+
 
 # --- Обработчики основных команд ---
 
@@ -64,21 +75,10 @@ async def cmd_start(message: Message):
         )
 
     # Роли: resident | specialist | manager
-    role_to_menu = {
-        'resident': kb.resident_menu,
-        'specialist': kb.specialist_menu,
-        'manager': kb.manager_menu,
-    }
-
     await message.answer(
-        (
-            f"Здравствуйте! 👋\n\n"
-            f"Ваша роль: <b>{user.role}</b>\n\n"
-            f"Я чат-бот вашей Управляющей Компании. "
-            f"Готов помочь вам с решением бытовых вопросов."
-        ),
+        rendering.welcome_text(user.role),
         parse_mode="HTML",
-        reply_markup=role_to_menu.get(user.role, kb.resident_menu)
+        reply_markup=rendering.menu_for_role(user.role)
     )
 
 
@@ -189,48 +189,304 @@ async def mod_set_role(message: Message):
         else:
             await message.answer("Пользователь ещё не писал боту. Роль будет применена после первого сообщения.")
 
+EXPORT_USAGE = (
+    "Использование: /mod_export [csv|xlsx] [from=ДД.ММ.ГГГГ] [to=ДД.ММ.ГГГГ] "
+    "[status=\"Взята в работу\"] [type=\"Не работает лифт\"]\n"
+    "Дата to включается в период."
+)
+
+def _parse_export_args(text: str) -> dict:
+    """Разбирает аргументы /mod_export; ValueError с пояснением при ошибке"""
+    try:
+        args = shlex.split(text)[1:]
+    except ValueError:
+        raise ValueError("Не закрыта кавычка.")
+    options = {'fmt': 'csv'}
+    for arg in args:
+        if arg.lower() in export.EXPORT_FORMATS:
+            options['fmt'] = arg.lower()
+            continue
+        name, sep, value = arg.partition('=')
+        if not sep or not value:
+            raise ValueError(f"Непонятный аргумент: {arg}")
+        if name in ('from', 'to'):
+            try:
+                day = datetime.strptime(value, '%d.%m.%Y')
+            except ValueError:
+                raise ValueError(f"Дата должна быть в формате ДД.ММ.ГГГГ: {value}")
+            if name == 'from':
+                options['date_from'] = day
+            else:
+                options['date_to'] = day + timedelta(days=1)
+        elif name == 'status':
+            options['status'] = value
+        elif name == 'type':
+            options['problem_type'] = value
+        else:
+            raise ValueError(f"Неизвестный фильтр: {name}")
+    return options
+
+@router.message(Command("mod_export"))
+async def mod_export(message: Message):
+    if not await _is_manager(message.from_user.id):
+        await message.answer("Команда доступна только модераторам.")
+        return
+    try:
+        options = _parse_export_args(message.text or "")
+    except ValueError as e:
+        await message.answer(f"{e}\n\n{EXPORT_USAGE}")
+        return
+    fmt = options.pop('fmt')
+    if fmt == 'xlsx' and not export.xlsx_available():
+        await message.answer("Выгрузка в XLSX недоступна на сервере, используйте csv.")
+        return
+
+    await message.answer("Готовлю выгрузку заявок...")
+    path, count = await export.export_tickets(fmt, **options)
+    try:
+        if not count:
+            await message.answer("Заявок по заданным фильтрам нет.")
+            return
+        filename = f"tickets_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}"
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"Заявок в выгрузке: {count}"
+        )
+    finally:
+        os.remove(path)
+
+def _format_duration(seconds):
+    if seconds is None:
+        return "—"
+    if seconds < 60:
+        return f"{int(seconds)} с"
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours = minutes // 60
+    if hours < 24:
+        return f"{hours} ч {minutes % 60} мин"
+    return f"{hours // 24} дн {hours % 24} ч"
+
+def _format_stat(title: str, item: dict, with_created: bool = True) -> str:
+    # Специалисту заявка достается только при взятии, поэтому "Создано" у него не считается
+    created = f"Создано: {item['created']} • " if with_created else ""
+    return (
+        f"<b>{title}</b>\n"
+        f"{created}В работе: {item['taken']} • Выполнено: {item['completed']} • "
+        f"Закрыто: {item['closed']} • Просрочено: {item['overdue']}\n"
+        f"До взятия: медиана {_format_duration(item['take_p50'])}, p90 {_format_duration(item['take_p90'])}\n"
+        f"До выполнения: медиана {_format_duration(item['complete_p50'])}, p90 {_format_duration(item['complete_p90'])}"
+    )
+
+@router.message(Command("mod_stats"))
+async def mod_stats(message: Message):
+    if not await _is_manager(message.from_user.id):
+        await message.answer("Команда доступна только модераторам.")
+        return
+    stats = await db.get_ticket_stats()
+    if ('all', '') not in stats:
+        await message.answer("Статистики пока нет.")
+        return
+    parts = [_format_stat("Все заявки", stats[('all', '')])]
+    by_problem = sorted((key, item) for (dimension, key), item in stats.items() if dimension == 'problem_type')
+    if by_problem:
+        parts.append("<b>По типам проблем</b>")
+        parts += [_format_stat(key or "Без типа", item) for key, item in by_problem]
+    by_specialist = [(key, item) for (dimension, key), item in stats.items() if dimension == 'specialist']
+    if by_specialist:
+        parts.append("<b>По специалистам</b>")
+        for key, item in sorted(by_specialist, key=lambda pair: -pair[1]['closed']):
+            specialist = await db.find_user_by_telegram_id(int(key))
+            title = f"@{specialist.username}" if specialist and specialist.username else f"ID:{key}"
+            parts.append(_format_stat(title, item, with_created=False))
+    await message.answer("\n\n".join(parts), parse_mode="HTML")
+
+
+@router.message(Command("mod_history"))
+async def mod_history(message: Message):
+    if not await _is_manager(message.from_user.id):
+        await message.answer("Команда доступна только модераторам.")
+        return
+
+    # Формат: /mod_history <id заявки>
+    args = (message.text or "").split(maxsplit=1)
+    ticket_ref = args[1].strip().lstrip('#') if len(args) > 1 else ""
+    if not ticket_ref.isdigit():
+        await message.answer("Использование: /mod_history <id заявки>")
+        return
+    ticket_id = int(ticket_ref)
+    events = await db.get_ticket_events(ticket_id)
+    if not events:
+        await message.answer(f"По заявке #{ticket_id} событий нет.")
+        return
+    await message.answer(rendering.ticket_history_text(ticket_id, events), parse_mode="HTML")
+
+BULK_CLOSE_USAGE = (
+    "Использование: /mod_bulk_close [type=\"Проблема с водой\"] [queue=1] [entrance=2] [floor=3] "
+    "[status=\"Проблема не выявлена\"] [comment=\"Авария устранена\"]\n"
+    "Нужен хотя бы один фильтр. По умолчанию заявки закрываются со статусом «Выполнено»."
+)
+
+def _parse_bulk_close_args(text: str) -> tuple[dict, dict]:
+    """Разбирает аргументы /mod_bulk_close: (фильтры, {status, comment}); ValueError при ошибке"""
+    try:
+        args = shlex.split(text)[1:]
+    except ValueError:
+        raise ValueError("Не закрыта кавычка.")
+    filters, options = {}, {'status': 'Выполнено', 'comment': None}
+    for arg in args:
+        name, sep, value = arg.partition('=')
+        if not sep or not value:
+            raise ValueError(f"Непонятный аргумент: {arg}")
+        if name in ('type', 'problem_type'):
+            filters['problem_type'] = value
+        elif name in ('queue', 'entrance', 'floor'):
+            filters[name] = value
+        elif name == 'status':
+            if value not in db.BULK_CLOSE_STATUSES:
+                raise ValueError(f"Статус должен быть одним из: {', '.join(db.BULK_CLOSE_STATUSES)}")
+            options['status'] = value
+        elif name == 'comment':
+            options['comment'] = value
+        else:
+            raise ValueError(f"Неизвестный фильтр: {name}")
+    if not filters:
+        raise ValueError("Нужен хотя бы один фильтр.")
+    return filters, options
+
+async def _notify_ticket_residents(tickets, header: str):
+    """Одно уведомление на жителя (автора или подписчика) со списком всех его заявок из пачки"""
+    by_id = {ticket.id: ticket for ticket in tickets}
+    by_chat: dict[int, dict] = {}
+    for ticket in tickets:
+        by_chat.setdefault(ticket.resident_id, {})[ticket.id] = ticket
+    for ticket_id, telegram_id in await db.list_subscribers_for_tickets(list(by_id)):
+        by_chat.setdefault(telegram_id, {})[ticket_id] = by_id[ticket_id]
+    for telegram_id, chat_tickets in by_chat.items():
+        text = f"{header}\n\n{rendering.ticket_list_lines(list(chat_tickets.values()))}"
+        notifications.dispatcher.enqueue(telegram_id, text, parse_mode="HTML")
+
+@router.message(Command("mod_bulk_close"))
+async def mod_bulk_close(message: Message, state: FSMContext):
+    if not await _is_manager(message.from_user.id):
+        await message.answer("Команда доступна только модераторам.")
+        return
+    try:
+        filters, options = _parse_bulk_close_args(message.text or "")
+    except ValueError as e:
+        await message.answer(f"{e}\n\n{BULK_CLOSE_USAGE}")
+        return
+    count = await db.count_open_tickets(filters)
+    if not count:
+        await message.answer("Открытых заявок по заданным фильтрам нет.")
+        return
+    # Фильтры и комментарий вводит модератор: экранируем их для HTML-разметки бота
+    text = (
+        f"Будет закрыто открытых заявок: {count}\n"
+        f"Фильтры: {rendering.bulk_filters_text(filters)}\n"
+        f"Новый статус: {options['status']}"
+    )
+    if options['comment']:
+        text += f"\nКомментарий: {html.escape(options['comment'])}"
+    await message.answer(text, reply_markup=kb.bulk_close_confirm_kb)
+    # Состояние - только после отправки превью; нажатие кнопки этого чата
+    # дождется конца обработки команды благодаря изоляции событий
+    await state.set_state(ModBulkCloseState.confirm)
+    await state.update_data(bulk_filters=filters, bulk_status=options['status'], bulk_comment=options['comment'])
+
+@router.callback_query(F.data == 'bulk_close_confirm', ModBulkCloseState.confirm)
+async def mod_bulk_close_confirmed(callback: CallbackQuery, state: FSMContext):
+    if not await _is_manager(callback.from_user.id):
+        await callback.answer("Недостаточно прав", show_alert=True)
+        return
+    data = await state.get_data()
+    await state.clear()
+    status, comment = data['bulk_status'], data.get('bulk_comment')
+    tickets = await db.bulk_close_tickets(data['bulk_filters'], callback.from_user.id, status, comment)
+    await callback.answer()
+    if not tickets:
+        await callback.message.edit_text("Открытых заявок по заданным фильтрам уже нет.")
+        return
+    await callback.message.edit_text(f"✅ Закрыто заявок: {len(tickets)}\n\n{rendering.ticket_list_lines(tickets)}")
+
+    header = f"🔔 <b>Статус ваших заявок изменен на «{status}»</b>"
+    if comment:
+        header += f"\n\n<b>Комментарий:</b>\n{html.escape(comment)}"
+    await _notify_ticket_residents(tickets, header)
+
+@router.callback_query(F.data == 'bulk_close_cancel', ModBulkCloseState.confirm)
+async def mod_bulk_close_cancelled(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.answer()
+    await callback.message.edit_text("Массовое закрытие отменено.")
+
+@router.callback_query(F.data.in_({'bulk_close_confirm', 'bulk_close_cancel'}))
+async def mod_bulk_close_expired(callback: CallbackQuery):
+    # Кнопка из старого сообщения: подтверждение уже выполнено, отменено или сброшено
+    await callback.answer("Подтверждение устарело, отправьте команду заново.", show_alert=True)
+
+async def _find_user_by_reference(reference: str):
+    """Пользователь по @username или telegram_id"""
+    reference = reference.strip()
+    if reference.isdigit():
+        return await db.find_user_by_telegram_id(int(reference))
+    return await db.find_user_by_username(reference.lstrip('@'))
+
+def _user_title(user) -> str:
+    return f"@{user.username}" if user.username else f"ID:{user.telegram_id}"
+
+@router.message(Command("mod_reassign"))
+async def mod_reassign(message: Message):
+    if not await _is_manager(message.from_user.id):
+        await message.answer("Команда доступна только модераторам.")
+        return
+
+    # Формат: /mod_reassign <@username|telegram_id прежнего> <@username|telegram_id нового>
+    args = (message.text or "").split()
+    if len(args) != 3:
+        await message.answer("Использование: /mod_reassign <@прежний|telegram_id> <@новый|telegram_id>")
+        return
+    old_user = await _find_user_by_reference(args[1])
+    new_user = await _find_user_by_reference(args[2])
+    for reference, user in ((args[1], old_user), (args[2], new_user)):
+        if user is None:
+            await message.answer(f"Пользователь {reference} ещё не писал боту.")
+            return
+    if old_user.telegram_id == new_user.telegram_id:
+        await message.answer("Укажите двух разных специалистов.")
+        return
+
+    old_title, new_title = _user_title(old_user), _user_title(new_user)
+    tickets = await db.reassign_open_tickets(
+        old_user.telegram_id, new_user.telegram_id, message.from_user.id,
+        comment=f"Передана от {old_title} к {new_title}",
+    )
+    if not tickets:
+        await message.answer(f"У {old_title} нет открытых заявок.")
+        return
+
+    ticket_lines = rendering.ticket_list_lines(tickets)
+    text = f"✅ Передано заявок от {old_title} к {new_title}: {len(tickets)}\n\n{ticket_lines}"
+    # Специалист видит в меню только заявки своих направлений
+    problem_types = sorted({ticket.problem_type for ticket in tickets})
+    unassigned = [
+        problem_type for problem_type in problem_types
+        if new_user.username not in [username for username, _ in await routing.table.specialists_for(problem_type)]
+    ]
+    if unassigned:
+        text += (
+            f"\n\n⚠️ {new_title} не назначен на типы: {', '.join(unassigned)}. "
+            f"Назначьте его через /mod_add_specialist, иначе он не увидит эти заявки в меню."
+        )
+    await message.answer(text)
+
+    notifications.dispatcher.enqueue(new_user.telegram_id, f"🔔 Вам переданы заявки от {old_title}:\n\n{ticket_lines}")
+    await _notify_ticket_residents(tickets, f"🔔 <b>Ответственный по вашим заявкам изменен: {html.escape(new_title)}</b>")
+
 @router.message(F.text == "ℹ️ Справочная информация")
 async def info_handler(message: Message):
-    info_text = (
-        "<b>КОНТАКТНАЯ ИНФОРМАЦИЯ</b>\n"
-        "УК «Сиди Дома»\n"
-        "🏠г. Тула, ул. Седова, д. 26 к. 1, помещение 769, офис 5 (вход со двора)\n"
-        "📧Эл.почта: sididoma71@yandex.ru\n"
-        "☎️Заместитель Директора \n"
-        "8-(993)-537-17-07 пн. – пт. (с 9:00 до 18:00);\n"
-        "☎️Директор инженерной службы 8-(933)-031-53-99 пн. – пт.  (с 9:00 до 18:00);\n\n"
-        "<b>КОНСЬЕРЖ (Аварийная служба) - Круглосуточно:</b>\n"
-        "<b>Корпус 1:</b>\n"
-        "☎️ 8-(915)-696-74-22 секция 1;\n"
-        "☎️ 8-(902)-901-06-92 секция 2.\n"
-        "<b>Корпус 2:</b>\n"
-        "☎️ 8-(902)-847-79-29 секция 1;\n"
-        "☎️ 8-(902)-846-73-31 секция 2.\n\n"
-        "<b>ОХРАНА – Круглосуточно:</b>\n"
-        "☎️ 8-(902)-750-08-63 - Охрана корпус 1; \n"
-        "☎️ 8-(953)-182-07-85 - Охрана корпус 2.\n\n"
-        "<b>МТС</b>\n"
-        "☎️Подключение сети интернет-менеджер компании МТС по ЖК «Фамилия»:\n"
-        "8-953-190-38-11- (с 9:00 до 18:00).\n"
-        "☎️Система контроля и управления доступом (домофоны/шлагбаумы):\n"
-        "Направление информации ТОЛЬКО WA/TG\n"
-        "8-(993)-537-93-90 - пн. – пт. (с 9:00 до 18:00).\n\n"
-        "<b>ООО «Лифт»</b>\n"
-        "☎️диспетчерская 8(4872)50‒03‒92 – Круглосуточно.\n\n"
-        "<b>АО «Тулагорводоканал»</b>\n"
-        "☎️ 8(4872)25-49-47, 42-53-34, 42-53-26 – Круглосуточно.\n\n"
-        "<b>АО «ТНС энерго Тула»</b>\n"
-        "☎️ 8-800-775-44-71 – Круглосуточно.\n\n"
-        "<b>ОЕИРЦ</b>\n"
-        "☎️ 8(4872)70-15-33, 70-15-34, 70-55-70 (доб.1020) - пн. – пт. (с 9:00 до 18:00)\n\n"
-        "<b>Отдел полиции по привокзальному району УМВД России г. Тула:</b>\n"
-        "☎️ 8(4872)32-47-00, 32-47-02, 39-00-79 – Круглосуточно.\n\n"
-        "<b>Администрация Привокзального района</b>\n"
-        "☎️ 8(4872)22-44-24, 22-44-66 - пн. – пт. (с 9:00 до 18:00).\n\n"
-        "<b>Государственная жилищная инспекция Тульской области</b>\n"
-        "☎️ 8(4872)24-51-60, 24-51-63 пн. – пт. (с 9:00 до 18:00)."
-    )
-    await message.answer(info_text, parse_mode="HTML")
+    await message.answer(rendering.INFO_TEXT, parse_mode="HTML")
 
 @router.message(F.text == "🏠 Главное меню")
 async def main_menu_handler(message: Message):
@@ -254,21 +510,10 @@ async def main_menu_handler(message: Message):
         )
 
     # Роли: resident | specialist | manager
-    role_to_menu = {
-        'resident': kb.resident_menu,
-        'specialist': kb.specialist_menu,
-        'manager': kb.manager_menu,
-    }
-
     await message.answer(
-        (
-            f"Здравствуйте! 👋\n\n"
-            f"Ваша роль: <b>{user.role}</b>\n\n"
-            f"Я чат-бот вашей Управляющей Компании. "
-            f"Готов помочь вам с решением бытовых вопросов."
-        ),
+        rendering.welcome_text(user.role),
         parse_mode="HTML",
-        reply_markup=role_to_menu.get(user.role, kb.resident_menu)
+        reply_markup=rendering.menu_for_role(user.role)
     )
 
 
@@ -280,70 +525,67 @@ async def specialist_my_tickets(message: Message):
     if user.role != 'specialist':
         await message.answer("Доступно только для специалистов.")
         return
-    tickets = await db.get_open_tickets_for_specialist_username(user.username or '')
+    tickets, _ = await db.get_open_tickets_page_for_specialist_username(user.username or '', limit=10)
     if tickets:
-        text_lines = ["Ваши заявки (только по вашим направлениям):"]
-        for t in tickets[:10]:
-            responsible = ""
-            if t.responsible_specialist_id:
-                responsible_user = await db.find_user_by_telegram_id(t.responsible_specialist_id)
-                responsible_username = responsible_user.username if responsible_user else f"ID:{t.responsible_specialist_id}"
-                responsible = f" (Ответственный: @{responsible_username})"
-            text_lines.append(f"#{t.id} • {t.problem_type} • {t.status}{responsible}")
+        text_lines = ["Ваши заявки (только по вашим направлениям):"] + [
+            rendering.specialist_ticket_line(t.id, t.problem_type, t.status, rendering.responsible_name(t))
+            for t in tickets
+        ]
         await message.answer("\n".join(text_lines))
         # Отправим фото по заявкам, если они есть
-        for t in tickets[:10]:
-            if getattr(t, 'photo_id', None):
-                caption = f"#{t.id} • {t.problem_type} • {t.status}"
-                try:
-                    await message.answer_photo(t.photo_id, caption=caption)
-                except Exception:
-                    pass
+        await notifications.send_photo_albums(message.bot, message.chat.id, [
+            (t.photo_id, rendering.ticket_photo_caption(t)) for t in tickets
+        ])
     else:
         await message.answer("Пока нет заявок по вашим направлениям.")
 
+async def _send_all_tickets_page(message: Message, cursor=None):
+    """Отправляет страницу списка всех заявок с кнопкой перехода к следующей"""
+    tickets, next_cursor = await db.get_tickets_page(cursor, limit=20)
+    if not tickets:
+        await message.answer("Заявок пока нет." if cursor is None else "Больше заявок нет.")
+        return
+    parts = ["Все заявки в системе:"] + [
+        rendering.all_tickets_entry(
+            t.id, t.problem_type, t.status, t.created_at, t.taken_at, t.estimated_days, t.completed_at,
+            rendering.responsible_name(t),
+        )
+        for t in tickets
+    ]
+    keyboard = None
+    if next_cursor:
+        keyboard = rendering.next_page_keyboard("all_tickets_next_", db.encode_cursor(next_cursor))
+    await message.answer("\n\n".join(parts), parse_mode="HTML", reply_markup=keyboard)
+    # Отправим фото по заявкам, если они есть
+    await notifications.send_photo_albums(message.bot, message.chat.id, [
+        (t.photo_id, rendering.all_tickets_photo_caption(t)) for t in tickets
+    ])
+
 @router.message(F.text == "📋 Все заявки")
 async def manager_all_tickets(message: Message):
     user = await db.upsert_user(telegram_id=message.from_user.id, username=message.from_user.username, full_name=message.from_user.full_name)
     if user.role != 'manager':
         await message.answer("Доступно только для модераторов.")
         return
-    tickets = await db.get_all_tickets()
-    if tickets:
-        parts = ["Все заявки в системе:"]
-        for t in tickets[:20]:
-            responsible = ""
-            if t.responsible_specialist_id:
-                responsible_user = await db.find_user_by_telegram_id(t.responsible_specialist_id)
-                responsible_username = responsible_user.username if responsible_user else f"ID:{t.responsible_specialist_id}"
-                responsible = f"\n<b>Ответственный:</b> @{responsible_username}"
-            details = (
-                f"<b>#{t.id}</b> • {t.problem_type} • {t.status}\n"
-                f"<b>Создана:</b> {t.created_at.strftime('%d.%m.%Y %H:%M')}"
-            )
-            if getattr(t, 'taken_at', None):
-                details += f"\n<b>Взята в работу:</b> {t.taken_at.strftime('%d.%m.%Y %H:%M')}"
-            if getattr(t, 'estimated_days', None) is not None:
-                days_text = f"{t.estimated_days} дней" if t.estimated_days and t.estimated_days > 0 else "неизвестно"
-                details += f"\n<b>Срок выполнения:</b> {days_text}"
-            if getattr(t, 'completed_at', None):
-                details += f"\n<b>Выполнена:</b> {t.completed_at.strftime('%d.%m.%Y %H:%M')}"
-            details += responsible
-            parts.append(details)
-        await message.answer("\n\n".join(parts), parse_mode="HTML")
-        # Отправим фото по заявкам, если они есть
-        for t in tickets[:20]:
-            if getattr(t, 'photo_id', None):
-                caption = (
-                    f"#{t.id} • {t.problem_type} • {t.status}\n"
-                    f"Создана: {t.created_at.strftime('%d.%m.%Y %H:%M')}"
-                )
-                try:
-                    await message.answer_photo(t.photo_id, caption=caption)
-                except Exception:
-                    pass
-    else:
-        await message.answer("Заявок пока нет.")
+    await _send_all_tickets_page(message)
+
+@router.callback_query(F.data.startswith('all_tickets_next_'))
+async def manager_all_tickets_next_page(callback: CallbackQuery):
+    if not await _is_manager(callback.from_user.id):
+        await callback.answer("Недостаточно прав", show_alert=True)
+        return
+    cursor = db.decode_cursor(callback.data.replace('all_tickets_next_', '', 1))
+    if cursor is None:
+        await callback.answer("Больше заявок нет")
+        return
+    await callback.answer()
+    await _send_all_tickets_page(callback.message, cursor)
+
+def _tickets_page_keyboard(tickets, next_cursor):
+    """Клавиатура выбора заявки для смены статуса"""
+    return rendering.tickets_page_keyboard(
+        rendering.ticket_summaries(tickets), db.encode_cursor(next_cursor) if next_cursor else None
+    )
 
 @router.message(F.text == "🔄 Изменить статус заявки")
 async def change_status_start(message: Message, state: FSMContext):
@@ -352,29 +594,12 @@ async def change_status_start(message: Message, state: FSMContext):
         await message.answer("Доступно только для специалистов.")
         return
     
-    tickets = await db.get_open_tickets_for_specialist_username(user.username or '')
+    tickets, next_cursor = await db.get_open_tickets_page_for_specialist_username(user.username or '', limit=10)
     if not tickets:
         await message.answer("У вас нет заявок для изменения статуса.")
         return
     
-    # Создаем клавиатуру с заявками
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    keyboard_buttons = []
-    page = 0
-    page_size = 10
-    page_items = tickets[page*page_size:(page+1)*page_size]
-    for t in page_items:
-        keyboard_buttons.append([InlineKeyboardButton(
-            text=f"#{t.id} • {t.problem_type} • {t.status}",
-            callback_data=f"ticket_{t.id}"
-        )])
-    # Кнопка следующей страницы, если есть ещё
-    if len(tickets) > (page+1)*page_size:
-        keyboard_buttons.append([InlineKeyboardButton(
-            text="Следующие заявки", callback_data=f"tickets_next_{page+1}"
-        )])
-
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    keyboard = _tickets_page_keyboard(tickets, next_cursor)
     await message.answer("Выберите заявку для изменения статуса:", reply_markup=keyboard)
     await state.set_state(StatusChangeState.choosing_ticket)
 
@@ -388,39 +613,28 @@ async def tickets_next_page(callback: CallbackQuery, state: FSMContext):
     if user.role != 'specialist':
         await callback.answer("Недостаточно прав", show_alert=True)
         return
-    try:
-        page = int(callback.data.split('_')[-1])
-    except Exception:
-        page = 0
-    tickets = await db.get_open_tickets_for_specialist_username(user.username or '')
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    page_size = 10
-    start = page * page_size
-    page_items = tickets[start:start+page_size]
-    if not page_items:
+    cursor = db.decode_cursor(callback.data.replace('tickets_next_', '', 1))
+    if cursor is None:
         await callback.answer("Больше заявок нет")
         return
-    keyboard_buttons = []
-    for t in page_items:
-        keyboard_buttons.append([InlineKeyboardButton(
-            text=f"#{t.id} • {t.problem_type} • {t.status}",
-            callback_data=f"ticket_{t.id}"
-        )])
-    if len(tickets) > (page+1)*page_size:
-        keyboard_buttons.append([InlineKeyboardButton(
-            text="Следующие заявки", callback_data=f"tickets_next_{page+1}"
-        )])
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    tickets, next_cursor = await db.get_open_tickets_page_for_specialist_username(user.username or '', cursor, limit=10)
+    if not tickets:
+        await callback.answer("Больше заявок нет")
+        return
+    keyboard = _tickets_page_keyboard(tickets, next_cursor)
     await callback.message.edit_reply_markup(reply_markup=keyboard)
 
 @router.callback_query(F.data.startswith('ticket_'), StatusChangeState.choosing_ticket)
 async def ticket_selected(callback: CallbackQuery, state: FSMContext):
     ticket_id = int(callback.data.split('_')[1])
-    await state.update_data(selected_ticket_id=ticket_id)
     await state.set_state(StatusChangeState.choosing_status)
     
     ticket = await db.get_ticket_by_id(ticket_id)
     if ticket:
+        # Версия нужна, чтобы не перезаписать изменения, сделанные после открытия заявки
+        await state.update_data(
+            selected_ticket_id=ticket_id, selected_ticket_version=ticket.version, selected_ticket_status=ticket.status,
+        )
         await callback.message.edit_text(
             f"Заявка #{ticket.id} выбрана.\n"
             f"Тип: {ticket.problem_type}\n"
@@ -462,6 +676,14 @@ async def status_changed(callback: CallbackQuery, state: FSMContext):
     if not new_status:
         await callback.answer("Неверный статус", show_alert=True)
         return
+    # Недопустимый переход отклоняем сразу, не спрашивая срок или комментарий
+    current_status = data.get('selected_ticket_status')
+    if current_status and not db.can_transition(current_status, new_status):
+        await callback.answer(
+            rendering.transition_conflict_text(ticket_id, new_status, 'invalid_transition', current_status),
+            show_alert=True,
+        )
+        return
     
     # Если статус "Взята в работу", запрашиваем количество дней
     if new_status == 'Взята в работу':
@@ -482,18 +704,32 @@ async def status_changed(callback: CallbackQuery, state: FSMContext):
         )
     else:
         # Для других статусов обновляем сразу
-        updated_ticket = await db.update_ticket_status(ticket_id, new_status, callback.from_user.id)
+        # Закрывающий записывается в журнал, ответственным остается взявший заявку
+        transition = await db.transition_ticket_status(
+            ticket_id, new_status, expected_version=data.get('selected_ticket_version'), actor_id=callback.from_user.id,
+        )
         
-        if updated_ticket:
+        if transition.ok:
             await callback.message.edit_text(
                 f"✅ Статус заявки #{ticket_id} изменен на: {new_status}\n"
-                f"Ответственный специалист: {callback.from_user.username or callback.from_user.full_name}"
+                f"Ответственный специалист: {await _responsible_title(transition.ticket)}"
             )
+            await _notify_status_change(transition.ticket, await _status_notification_text(transition.ticket))
         else:
-            await callback.message.edit_text("Ошибка при обновлении статуса.")
+            await callback.message.edit_text(_transition_conflict_text(ticket_id, new_status, transition))
         
         await state.clear()
 
+def _transition_conflict_text(ticket_id: int, new_status: str, transition) -> str:
+    return rendering.transition_conflict_text(ticket_id, new_status, transition.conflict, transition.current_status)
+
+async def _responsible_title(ticket) -> str:
+    """@username ответственного специалиста заявки (ID:..., если он не писал боту)"""
+    if not ticket.responsible_specialist_id:
+        return "не назначен"
+    user = await db.find_user_by_telegram_id(ticket.responsible_specialist_id)
+    return f"@{user.username}" if user and user.username else f"ID:{ticket.responsible_specialist_id}"
+
 @router.message(StatusChangeState.estimated_days)
 async def estimated_days_received(message: Message, state: FSMContext):
     """Обработчик ввода количества дней на выполнение"""
@@ -511,22 +747,24 @@ async def estimated_days_received(message: Message, state: FSMContext):
         return
     
     # Обновляем заявку со статусом и количеством дней
-    updated_ticket = await db.update_ticket_status(
+    transition = await db.transition_ticket_status(
         ticket_id, 
         new_status, 
         message.from_user.id,
-        estimated_days=estimated_days
+        estimated_days=estimated_days,
+        expected_version=data.get('selected_ticket_version'),
     )
     
-    if updated_ticket:
+    if transition.ok:
         days_text = f"{estimated_days} дней" if estimated_days > 0 else "неизвестно"
         await message.answer(
             f"✅ Заявка #{ticket_id} взята в работу!\n"
             f"Срок выполнения: {days_text}\n"
             f"Ответственный специалист: @{message.from_user.username or message.from_user.full_name}"
         )
+        await _notify_status_change(transition.ticket, await _status_notification_text(transition.ticket))
     else:
-        await message.answer("Ошибка при обновлении статуса заявки.")
+        await message.answer(_transition_conflict_text(ticket_id, new_status, transition))
     
     await state.clear()
 
@@ -558,52 +796,28 @@ async def completion_photo_received(message: Message, state: FSMContext):
         photo_id = message.photo[-1].file_id
     
     # Обновляем заявку с комментарием и фото
-    updated_ticket = await db.update_ticket_status(
+    transition = await db.transition_ticket_status(
         ticket_id, 
         new_status, 
-        message.from_user.id, 
-        comment, 
-        photo_id
+        completion_comment=comment, 
+        completion_photo_id=photo_id,
+        expected_version=data.get('selected_ticket_version'),
+        actor_id=message.from_user.id,
     )
+    updated_ticket = transition.ticket
     
     if updated_ticket:
-        # Отправляем уведомление создателю заявки
-        try:
-            resident_user = await db.find_user_by_telegram_id(updated_ticket.resident_id)
-            if resident_user:
-                notification_text = (
-                    f"🔔 <b>Заявка #{ticket_id} выполнена!</b>\n\n"
-                    f"<b>Проблема:</b> {updated_ticket.problem_type}\n"
-                    f"<b>Статус:</b> {new_status}\n"
-                    f"<b>Ответственный:</b> @{message.from_user.username or message.from_user.full_name}\n"
-                )
-                
-                if comment:
-                    notification_text += f"\n<b>Комментарий специалиста:</b>\n{comment}"
-                
-                await message.bot.send_message(
-                    chat_id=updated_ticket.resident_id,
-                    text=notification_text,
-                    parse_mode="HTML"
-                )
-                
-                # Отправляем фото, если есть
-                if photo_id:
-                    await message.bot.send_photo(
-                        chat_id=updated_ticket.resident_id,
-                        photo=photo_id,
-                        caption="Фото выполненной работы"
-                    )
-        except Exception as e:
-            # Если не удалось отправить уведомление, продолжаем
-            pass
+        # Уведомляем создателя заявки и присоединившихся жителей
+        await _notify_status_change(
+            updated_ticket, await _status_notification_text(updated_ticket, comment), photo_id,
+        )
         
         await message.answer(
             f"✅ Заявка #{ticket_id} успешно выполнена!\n"
             f"Создатель заявки получил уведомление."
         )
     else:
-        await message.answer("Ошибка при обновлении заявки.")
+        await message.answer(_transition_conflict_text(ticket_id, new_status, transition))
     
     await state.clear()
 
@@ -617,8 +831,65 @@ async def manager_assign_entry(message: Message, state: FSMContext):
     await message.answer("Выберите тип проблемы:", reply_markup=kb.mod_problem_type_kb)
 
 
+# --- Заявки жителя ---
+
+async def _resident_tickets_page(resident_id: int, cursor=None):
+    """Текст и клавиатура страницы «Мои заявки»; None, если заявок нет"""
+    tickets, next_cursor = await db.get_tickets_page_for_resident(resident_id, cursor, limit=10)
+    if not tickets:
+        return None, None
+    lines = ["Ваши заявки:"] + [
+        rendering.resident_ticket_line(t.id, t.problem_type, t.status, t.created_at, t.taken_at, t.estimated_days)
+        for t in tickets
+    ]
+    keyboard = rendering.resident_tickets_keyboard(
+        tuple(t.id for t in tickets), db.encode_cursor(next_cursor) if next_cursor else None
+    )
+    return "\n".join(lines), keyboard
+
+@router.message(F.text == "📂 Мои заявки")
+async def resident_my_tickets(message: Message):
+    text, keyboard = await _resident_tickets_page(message.from_user.id)
+    if text is None:
+        await message.answer("У вас пока нет заявок.")
+        return
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+@router.callback_query(F.data.startswith('my_tickets_next_'))
+async def resident_my_tickets_next_page(callback: CallbackQuery):
+    cursor = db.decode_cursor(callback.data.replace('my_tickets_next_', '', 1))
+    text, keyboard = (None, None) if cursor is None else await _resident_tickets_page(callback.from_user.id, cursor)
+    if text is None:
+        await callback.answer("Больше заявок нет")
+        return
+    await callback.answer()
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+@router.callback_query(F.data.startswith('my_ticket_'))
+async def resident_ticket_details(callback: CallbackQuery):
+    ticket_id = callback.data.replace('my_ticket_', '', 1)
+    ticket = await db.get_ticket_by_id(int(ticket_id)) if ticket_id.isdigit() else None
+    if ticket is None or ticket.resident_id != callback.from_user.id:
+        await callback.answer("Заявка не найдена", show_alert=True)
+        return
+    await callback.answer()
+    await _send_ticket_details(callback.message, ticket)
+
+
 # --- Логика проверки статуса заявки ---
 
+async def _send_ticket_details(message: Message, ticket):
+    """Отправляет карточку заявки с фото проблемы и выполненной работы"""
+    await message.answer(rendering.ticket_card(ticket), parse_mode="HTML")
+
+    # Показываем фото проблемы, если есть
+    if ticket.photo_id:
+        await message.answer_photo(ticket.photo_id, caption="Фото проблемы:")
+
+    # Показываем фото выполненной работы, если есть
+    if ticket.status == 'Выполнено' and ticket.completion_photo_id:
+        await message.answer_photo(ticket.completion_photo_id, caption="Фото выполненной работы:")
+
 @router.message(F.text == "🔍 Проверить статус заявки")
 async def check_status_start(message: Message, state: FSMContext):
     await message.answer("Пожалуйста, введите номер вашей заявки:")
@@ -634,53 +905,57 @@ async def process_ticket_id(message: Message, state: FSMContext):
     ticket = await db.get_ticket_by_id(ticket_id)
 
     if ticket:
-        # Получаем информацию об ответственном специалисте
-        responsible_info = ""
-        if ticket.responsible_specialist_id:
-            responsible_user = await db.find_user_by_telegram_id(ticket.responsible_specialist_id)
-            if responsible_user:
-                responsible_info = f"\n<b>Ответственный:</b> @{responsible_user.username}"
-            else:
-                responsible_info = f"\n<b>Ответственный:</b> ID:{ticket.responsible_specialist_id}"
-        
-        response = (
-            f"<b>Заявка №{ticket.id}</b>\n\n"
-            f"<b>Статус:</b> {ticket.status}\n"
-            f"<b>Проблема:</b> {ticket.problem_type}\n"
-            f"<b>Описание:</b> {ticket.description}\n"
-            f"<b>Дата создания:</b> {ticket.created_at.strftime('%d.%m.%Y %H:%M')}"
-            f"{responsible_info}"
-        )
-        
-        # Добавляем информацию о взятии в работу, если есть
-        if ticket.taken_at:
-            response += f"\n<b>Дата взятия в работу:</b> {ticket.taken_at.strftime('%d.%m.%Y %H:%M')}"
-            if ticket.estimated_days is not None:
-                days_text = f"{ticket.estimated_days} дней" if ticket.estimated_days > 0 else "неизвестно"
-                response += f"\n<b>Срок выполнения:</b> {days_text}"
-        
-        # Добавляем информацию о завершении, если заявка выполнена
-        if ticket.status == 'Выполнено':
-            if ticket.completed_at:
-                response += f"\n<b>Дата выполнения:</b> {ticket.completed_at.strftime('%d.%m.%Y %H:%M')}"
-            if ticket.completion_comment:
-                response += f"\n\n<b>Комментарий специалиста:</b>\n{ticket.completion_comment}"
-        
-        await message.answer(response, parse_mode="HTML")
-        
-        # Показываем фото проблемы, если есть
-        if ticket.photo_id:
-            await message.answer_photo(ticket.photo_id, caption="Фото проблемы:")
-        
-        # Показываем фото выполненной работы, если есть
-        if ticket.status == 'Выполнено' and ticket.completion_photo_id:
-            await message.answer_photo(ticket.completion_photo_id, caption="Фото выполненной работы:")
+        await _send_ticket_details(message, ticket)
     else:
         await message.answer("Заявка с таким номером не найдена.")
     
     await state.clear()
 
 
+# --- Поиск заявок ---
+
+async def _send_search_page(message: Message, user, query: str, cursor: int | None = None):
+    """Отправляет страницу результатов поиска; жители ищут только среди своих заявок"""
+    resident_id = user.telegram_id if user.role == 'resident' else None
+    tickets, next_cursor = await db.search_tickets(query, resident_id=resident_id, cursor=cursor, limit=10)
+    if not tickets:
+        await message.answer("Ничего не найдено." if cursor is None else "Больше результатов нет.")
+        return
+    lines = [f"Результаты поиска «{html.escape(query)}»:"]
+    for t in tickets:
+        description = html.escape((t.description or '')[:80])
+        lines.append(
+            f"<b>#{t.id}</b> • {t.problem_type} • {t.status} • {t.created_at.strftime('%d.%m.%Y')}\n{description}"
+        )
+    keyboard = None
+    if next_cursor:
+        keyboard = rendering.next_page_keyboard("search_next_", str(next_cursor), "Следующие результаты")
+    await message.answer("\n\n".join(lines), parse_mode="HTML", reply_markup=keyboard)
+
+@router.message(Command("search"))
+async def search_command(message: Message, state: FSMContext):
+    args = (message.text or "").split(maxsplit=1)
+    if len(args) < 2 or not args[1].strip():
+        await message.answer("Использование: /search <слова>, например: /search протечка этаж 7")
+        return
+    query = args[1].strip()
+    user = await db.upsert_user(telegram_id=message.from_user.id, username=message.from_user.username, full_name=message.from_user.full_name)
+    # Запрос нужен для следующих страниц: в callback_data он может не поместиться
+    await state.update_data(search_query=query)
+    await _send_search_page(message, user, query)
+
+@router.callback_query(F.data.startswith('search_next_'))
+async def search_next_page(callback: CallbackQuery, state: FSMContext):
+    query = (await state.get_data()).get('search_query')
+    cursor = callback.data.replace('search_next_', '', 1)
+    if not query or not cursor.isdigit():
+        await callback.answer("Повторите поиск командой /search", show_alert=True)
+        return
+    user = await db.upsert_user(telegram_id=callback.from_user.id, username=callback.from_user.username, full_name=callback.from_user.full_name)
+    await callback.answer()
+    await _send_search_page(callback.message, user, query, int(cursor))
+
+
 # --- Логика создания новой заявки (FSM) ---
 
 @router.message(F.text == "✍️ Сообщить о проблеме")
@@ -753,20 +1028,53 @@ async def description_typed(message: Message, state: FSMContext):
     )
     await message.answer("Вы можете пропустить фото:", reply_markup=kb.skip_ticket_photo_kb)
 
-@router.message(TicketState.uploading_photo)
-async def photo_uploaded(message: Message, state: FSMContext):
-    if message.photo:
-        await state.update_data(photo_id=message.photo[-1].file_id)
-    else:
-        await state.update_data(photo_id=None)
-
-    # --- Сбор всех данных и создание заявки ---
-    data = await state.get_data()
-    
-    # TODO: Проверка на дубликаты перед созданием
-    
+async def _notify_specialists(ticket, specialists):
+    """Ставит в очередь личные уведомления специалистам, которые уже взаимодействовали с ботом"""
+    caption = (
+        f"🔔 Вам назначен новый тикет #{ticket.id}\n"
+        f"Тип: {ticket.problem_type}\n"
+        f"Описание: {ticket.description}"
+    )
+    for _, telegram_id in specialists:
+        if telegram_id:
+            notifications.dispatcher.enqueue(telegram_id, caption, photo=ticket.photo_id)
+
+async def _notify_subscribers(ticket_id: int, text: str, photo_id: str = None):
+    """Ставит в очередь уведомление жителям, присоединившимся к заявке как к дубликату"""
+    for telegram_id in await db.list_ticket_subscribers(ticket_id):
+        notifications.dispatcher.enqueue(telegram_id, text, parse_mode="HTML")
+        if photo_id:
+            notifications.dispatcher.enqueue(telegram_id, "Фото выполненной работы", photo=photo_id)
+
+async def _notify_status_change(ticket, text: str, photo_id: str = None):
+    """Уведомление о смене статуса автору заявки и присоединившимся жителям - через очередь рассылки"""
+    notifications.dispatcher.enqueue(ticket.resident_id, text, parse_mode="HTML")
+    if photo_id:
+        notifications.dispatcher.enqueue(ticket.resident_id, "Фото выполненной работы", photo=photo_id)
+    await _notify_subscribers(ticket.id, text, photo_id)
+
+async def _status_notification_text(ticket, comment: str = None) -> str:
+    headers = {
+        'Взята в работу': "взята в работу",
+        'Выполнено': "выполнена!",
+        'Проблема не выявлена': "закрыта: проблема не выявлена",
+    }
+    text = (
+        f"🔔 <b>Заявка #{ticket.id} {headers.get(ticket.status, ticket.status)}</b>\n\n"
+        f"<b>Проблема:</b> {ticket.problem_type}\n"
+        f"<b>Статус:</b> {ticket.status}\n"
+        f"<b>Ответственный:</b> {html.escape(await _responsible_title(ticket))}\n"
+    )
+    if ticket.status == 'Взята в работу' and ticket.estimated_days:
+        text += f"<b>Срок выполнения:</b> {ticket.estimated_days} дн.\n"
+    if comment:
+        text += f"\n<b>Комментарий специалиста:</b>\n{html.escape(comment)}"
+    return text
+
+async def _submit_ticket(message: Message, from_user: types.User, data: dict):
+    """Создает заявку из данных FSM или присоединяет жителя к открытой заявке-дубликату"""
     ticket_data_for_db = {
-        'resident_id': message.from_user.id,
+        'resident_id': from_user.id,
         'location_queue': data.get('queue'),
         'location_entrance': data.get('entrance'),
         'location_floor': data.get('floor'),
@@ -774,40 +1082,37 @@ async def photo_uploaded(message: Message, state: FSMContext):
         'description': data.get('description'),
         'photo_id': data.get('photo_id')
     }
-    
-    new_ticket = await db.add_new_ticket(ticket_data_for_db)
 
-    # Оповещение специалистов соответствующего типа
-    specialists = await db.list_specialists_for_problem(new_ticket.problem_type)
+    # Житель должен быть в users: tickets.resident_id - внешний ключ (проверяется в PostgreSQL)
+    await db.upsert_user(telegram_id=from_user.id, username=from_user.username, full_name=from_user.full_name)
+
+    async with dedup.index.lock(ticket_data_for_db):
+        duplicate = await dedup.index.find(ticket_data_for_db)
+        if duplicate is None:
+            new_ticket = await db.add_new_ticket(ticket_data_for_db)
+            dedup.index.add(new_ticket)
+
+    if duplicate is not None:
+        # Такая заявка уже открыта: подписываем жителя вместо новой записи и рассылки специалистам
+        if duplicate.resident_id != from_user.id:
+            await db.add_ticket_subscriber(duplicate.id, from_user.id)
+        await message.answer(
+            f"ℹ️ Об этой проблеме уже сообщили: заявка <b>#{duplicate.id}</b> ({duplicate.status}).\n\n"
+            "Мы не стали создавать новую заявку и сообщим вам, когда проблема будет решена.",
+            parse_mode="HTML",
+            reply_markup=kb.main_menu
+        )
+        return
+
+    # Оповещение специалистов соответствующего типа (по таблице маршрутизации, без запросов к базе)
+    specialists = await routing.table.specialists_for(new_ticket.problem_type)
     if specialists:
-        mentions = ", ".join([f"@{s.specialist_username}" for s in specialists])
+        mentions = ", ".join([f"@{username}" for username, _ in specialists])
         await message.answer(
             f"🔔 Новый тикет #{new_ticket.id} ({new_ticket.problem_type}). Специалисты: {mentions}"
         )
-        # Пытаемся отправить личные уведомления специалистам, которые уже взаимодействовали с ботом
-        for s in specialists:
-            specialist_user = await db.find_user_by_username(s.specialist_username)
-            if specialist_user and specialist_user.telegram_id:
-                try:
-                    caption = (
-                        f"🔔 Вам назначен новый тикет #{new_ticket.id}\n"
-                        f"Тип: {new_ticket.problem_type}\n"
-                        f"Описание: {new_ticket.description}"
-                    )
-                    if getattr(new_ticket, 'photo_id', None):
-                        await message.bot.send_photo(
-                            chat_id=specialist_user.telegram_id,
-                            photo=new_ticket.photo_id,
-                            caption=caption
-                        )
-                    else:
-                        await message.bot.send_message(
-                            chat_id=specialist_user.telegram_id,
-                            text=caption
-                        )
-                except Exception:
-                    pass
-    
+        await _notify_specialists(new_ticket, specialists)
+
     await message.answer(
         f"✅ Ваша заявка принята! \n\n"
         f"Номер вашей заявки: <b>{new_ticket.id}</b>\n\n"
@@ -815,7 +1120,17 @@ async def photo_uploaded(message: Message, state: FSMContext):
         parse_mode="HTML",
         reply_markup=kb.main_menu
     )
-    
+
+@router.message(TicketState.uploading_photo)
+async def photo_uploaded(message: Message, state: FSMContext):
+    if message.photo:
+        await state.update_data(photo_id=message.photo[-1].file_id)
+    else:
+        await state.update_data(photo_id=None)
+
+    # --- Сбор всех данных и создание заявки ---
+    data = await state.get_data()
+    await _submit_ticket(message, message.from_user, data)
     await state.clear()
 
 @router.callback_query(F.data == 'skip_ticket_photo', TicketState.uploading_photo)
@@ -823,44 +1138,7 @@ async def skip_ticket_photo(callback: CallbackQuery, state: FSMContext):
     # Пропуск фото при создании заявки
     await state.update_data(photo_id=None)
     data = await state.get_data()
-    ticket_data_for_db = {
-        'resident_id': callback.from_user.id,
-        'location_queue': data.get('queue'),
-        'location_entrance': data.get('entrance'),
-        'location_floor': data.get('floor'),
-        'problem_type': data.get('problem_type'),
-        'description': data.get('description'),
-        'photo_id': None
-    }
-    new_ticket = await db.add_new_ticket(ticket_data_for_db)
-    specialists = await db.list_specialists_for_problem(new_ticket.problem_type)
-    if specialists:
-        mentions = ", ".join([f"@{s.specialist_username}" for s in specialists])
-        await callback.message.answer(
-            f"🔔 Новый тикет #{new_ticket.id} ({new_ticket.problem_type}). Специалисты: {mentions}"
-        )
-        for s in specialists:
-            specialist_user = await db.find_user_by_username(s.specialist_username)
-            if specialist_user and specialist_user.telegram_id:
-                try:
-                    caption = (
-                        f"🔔 Вам назначен новый тикет #{new_ticket.id}\n"
-                        f"Тип: {new_ticket.problem_type}\n"
-                        f"Описание: {new_ticket.description}"
-                    )
-                    await callback.message.bot.send_message(
-                        chat_id=specialist_user.telegram_id,
-                        text=caption
-                    )
-                except Exception:
-                    pass
-    await callback.message.answer(
-        f"✅ Ваша заявка принята! \n\n"
-        f"Номер вашей заявки: <b>{new_ticket.id}</b>\n\n"
-        "Вы можете отследить её статус в главном меню.",
-        parse_mode="HTML",
-        reply_markup=kb.main_menu
-    )
+    await _submit_ticket(callback.message, callback.from_user, data)
     await state.clear()
 
 @router.callback_query(F.data == 'skip_comment', StatusChangeState.completion_comment)
@@ -878,36 +1156,20 @@ async def skip_completion_photo(callback: CallbackQuery, state: FSMContext):
     ticket_id = data.get('selected_ticket_id')
     new_status = data.get('new_status')
     comment = data.get('completion_comment')
-    updated_ticket = await db.update_ticket_status(
+    transition = await db.transition_ticket_status(
         ticket_id,
         new_status,
-        callback.from_user.id,
-        comment,
-        None
+        completion_comment=comment,
+        expected_version=data.get('selected_ticket_version'),
+        actor_id=callback.from_user.id,
     )
+    updated_ticket = transition.ticket
     if updated_ticket:
-        try:
-            resident_user = await db.find_user_by_telegram_id(updated_ticket.resident_id)
-            if resident_user:
-                notification_text = (
-                    f"🔔 <b>Заявка #{ticket_id} выполнена!</b>\n\n"
-                    f"<b>Проблема:</b> {updated_ticket.problem_type}\n"
-                    f"<b>Статус:</b> {new_status}\n"
-                    f"<b>Ответственный:</b> @{callback.from_user.username or callback.from_user.full_name}\n"
-                )
-                if comment:
-                    notification_text += f"\n<b>Комментарий специалиста:</b>\n{comment}"
-                await callback.message.bot.send_message(
-                    chat_id=updated_ticket.resident_id,
-                    text=notification_text,
-                    parse_mode="HTML"
-                )
-        except Exception:
-            pass
+        await _notify_status_change(updated_ticket, await _status_notification_text(updated_ticket, comment))
         await callback.message.edit_text(
             f"✅ Заявка #{ticket_id} успешно выполнена!\n"
             f"Создатель заявки получил уведомление."
         )
     else:
-        await callback.message.edit_text("Ошибка при обновлении заявки.")
+        await callback.message.edit_text(_transition_conflict_text(ticket_id, new_status, transition))
     await state.clear()
\ No newline at end of file
@@ -5,6 +5,7 @@ resident_menu = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text="ℹ️ Справочная информация")],
         [KeyboardButton(text="✍️ Сообщить о проблеме")],
+        [KeyboardButton(text="📂 Мои заявки")],
         [KeyboardButton(text="🔍 Проверить статус заявки")]
     ],
     resize_keyboard=True
@@ -85,4 +86,9 @@ skip_comment_kb = InlineKeyboardMarkup(inline_keyboard=[
 
 skip_completion_photo_kb = InlineKeyboardMarkup(inline_keyboard=[
     [InlineKeyboardButton(text="Пропустить", callback_data="skip_completion_photo")]
-])
\ No newline at end of file
+])
+# --- Подтверждение массового закрытия заявок модератором ---
+bulk_close_confirm_kb = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="✅ Закрыть", callback_data="bulk_close_confirm")],
+    [InlineKeyboardButton(text="Отмена", callback_data="bulk_close_cancel")]
+])
@@ -0,0 +1,362 @@
+"""Метрики горячего пути в формате Prometheus.
+
+Собираются:
+- время обработки обновления и каждого хэндлера (aiogram-middleware);
+- число и длительность SQL-запросов, в том числе на одно обновление
+  (события SQLAlchemy before/after_cursor_execute);
+- задержка вызовов Telegram API (middleware сессии бота);
+- время операций FSM-хранилища (обертка TimedStorage);
+- ожидание блокировки чата (concurrency.KeyedEventIsolation).
+
+Метрики отдаются текстом по GET /metrics (METRICS_PORT в режиме polling,
+тот же сервер в режиме вебхука) и/или печатаются в лог раз в
+METRICS_LOG_INTERVAL секунд.
+"""
+import asyncio
+import bisect
+import contextvars
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiohttp import web
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин, секунды: от долей миллисекунды (кэш, SQLite) до таймаутов сети
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {value:g}" for key, value in sorted(self._values.items())]
+        return lines
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: наблюдение - это bisect и пара сложений"""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        # метки -> [счетчики корзин (+ корзина +Inf), сумма]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def percentile(self, q: float, **labels) -> float | None:
+        """Оценка перцентиля по верхней границе корзины"""
+        series = self._series.get(tuple(sorted(labels.items())))
+        if series is None:
+            return None
+        counts = series[0]
+        target = q * sum(counts)
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            if running >= target:
+                return bound
+        return float('inf')
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            running = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                running += count
+                le = "+Inf" if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', le),))} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Counter | Histogram] = []
+        # Функции, возвращающие строки уже готовых метрик (очереди, счетчики других модулей)
+        self.collectors: list[Callable[[], list[str]]] = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], list[str]]):
+        """Регистрирует сборщик; повторная регистрация задвоила бы семейства метрик в выводе"""
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collector in self.collectors:
+            try:
+                lines += collector()
+            except Exception:
+                logger.exception("Ошибка сборщика метрик")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+updates_total = registry.counter("bot_updates_total", "Обработанные обновления по типу и результату")
+update_seconds = registry.histogram("bot_update_duration_seconds", "Время обработки обновления целиком")
+handler_seconds = registry.histogram("bot_handler_duration_seconds", "Время работы хэндлера")
+db_queries_total = registry.counter("bot_db_queries_total", "SQL-запросы по типу оператора")
+db_query_seconds = registry.histogram("bot_db_query_duration_seconds", "Длительность SQL-запроса")
+db_queries_per_update = registry.histogram(
+    "bot_db_queries_per_update", "Число SQL-запросов, выполненных при обработке одного обновления", QUERY_COUNT_BUCKETS,
+)
+db_seconds_per_update = registry.histogram("bot_db_time_per_update_seconds", "Суммарное время SQL за одно обновление")
+telegram_seconds = registry.histogram("bot_telegram_request_duration_seconds", "Задержка вызова Telegram API")
+telegram_errors_total = registry.counter("bot_telegram_request_errors_total", "Вызовы Telegram API, завершившиеся ошибкой")
+fsm_seconds = registry.histogram("bot_fsm_storage_duration_seconds", "Время операции FSM-хранилища")
+# Блокировка чата берется до UpdateMetricsMiddleware, поэтому ожидание в очереди
+# чата не входит в bot_update_duration_seconds и считается отдельно
+chat_lock_wait_seconds = registry.histogram(
+    "bot_chat_lock_wait_seconds", "Ожидание обработки предыдущего обновления того же чата",
+)
+
+
+# --- Обновления и хэндлеры ---
+
+class _UpdateStats:
+    __slots__ = ("queries", "db_time", "active")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.active = True
+
+
+# Учет SQL текущего обновления. Фоновые задачи, запущенные из хэндлера, наследуют
+# контекст, поэтому после завершения обновления запись помечается неактивной.
+_current_update: contextvars.ContextVar[Optional[_UpdateStats]] = contextvars.ContextVar("metrics_update", default=None)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: время обновления и SQL-запросы за него"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        stats = _UpdateStats()
+        token = _current_update.set(stats)
+        started = time.perf_counter()
+        result = 'error'
+        try:
+            response = await handler(event, data)
+            result = 'ok'
+            return response
+        finally:
+            stats.active = False
+            _current_update.reset(token)
+            update_type = getattr(event, 'event_type', 'unknown')
+            update_seconds.observe(time.perf_counter() - started, type=update_type)
+            updates_total.inc(type=update_type, result=result)
+            db_queries_per_update.observe(stats.queries, type=update_type)
+            db_seconds_per_update.observe(stats.db_time, type=update_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware на обсервере роутера: время конкретного хэндлера"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, handler=name)
+
+
+# --- SQL ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started'].pop()
+    elapsed = time.perf_counter() - started
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'EMPTY'
+    db_queries_total.inc(operation=operation)
+    db_query_seconds.observe(elapsed, operation=operation)
+    stats = _current_update.get()
+    if stats is not None and stats.active:
+        stats.queries += 1
+        stats.db_time += elapsed
+
+
+def _handle_error(exception_context):
+    # Запрос упал: снимаем отметку начала, иначе стек рассинхронизируется
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('metrics_started'):
+        connection.info['metrics_started'].pop()
+
+
+def instrument_engine(engine):
+    """Подключает учет SQL к AsyncEngine (или синхронному Engine)"""
+    sync_engine = getattr(engine, 'sync_engine', engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+# --- Telegram API ---
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: задержка каждого вызова API по методу"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            telegram_errors_total.inc(method=name)
+            raise
+        finally:
+            telegram_seconds.observe(time.perf_counter() - started, method=name)
+
+
+# --- FSM ---
+
+class TimedStorage(BaseStorage):
+    """Обертка FSM-хранилища, замеряющая время каждой операции"""
+
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+
+    async def _timed(self, operation: str, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            fsm_seconds.observe(time.perf_counter() - started, operation=operation)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        return await self._timed('set_state', self.storage.set_state(key, state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return await self._timed('get_state', self.storage.get_state(key))
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        return await self._timed('set_data', self.storage.set_data(key, data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return await self._timed('get_data', self.storage.get_data(key))
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._timed('update_data', self.storage.update_data(key, data))
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+# --- Подключение и выдача ---
+
+def gauge_lines(name: str, help_text: str, values: dict) -> list[str]:
+    """Строки gauge-метрики для сборщиков: {метки-кортеж: значение}"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{_format_labels(key)} {value:g}" for key, value in values.items()]
+    return lines
+
+
+def setup(dp, bot, engines=()):
+    """Подключает все middleware и SQL-хуки к диспетчеру, боту и движкам"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(HandlerMetricsMiddleware())
+    bot.session.middleware(TelegramMetricsMiddleware())
+    for engine in engines:
+        instrument_engine(engine)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+def add_metrics_route(app: web.Application, path: str = "/metrics"):
+    app.router.add_get(path, handle_metrics)
+
+
+async def start_metrics_server(host: str, port: int, path: str = "/metrics") -> web.AppRunner:
+    """Отдельный HTTP-сервер метрик для режима polling"""
+    app = web.Application()
+    add_metrics_route(app, path)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Метрики доступны на %s:%s%s", host, port, path)
+    return runner
+
+
+def summary() -> str:
+    """Короткая сводка p50/p99 для лога"""
+    parts = []
+    for metric, label in ((update_seconds, 'type'), (handler_seconds, 'handler'), (telegram_seconds, 'method')):
+        for key in sorted(metric._series):
+            labels = dict(key)
+            count = sum(metric._series[key][0])
+            p50 = metric.percentile(0.5, **labels)
+            p99 = metric.percentile(0.99, **labels)
+            parts.append(f"{metric.name}[{labels.get(label)}] n={count} p50<={p50 * 1000:g}ms p99<={p99 * 1000:g}ms")
+    return "\n".join(parts) or "нет данных"
+
+
+async def log_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        logger.info("Метрики:\n%s", summary())
@@ -0,0 +1,92 @@
+import asyncio
+from logging.config import fileConfig
+
+from sqlalchemy import Integer, pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import async_engine_from_config
+
+from alembic import context
+
+import database as db
+
+config = context.config
+
+# Соединение передается из database.create_db_and_tables() при запуске бота.
+# В этом случае логирование уже настроено приложением.
+shared_connection = config.attributes.get("connection")
+
+if shared_connection is None and config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+if not config.get_main_option("sqlalchemy.url"):
+    # % в URL (пароли в url-encoding) нужно экранировать для configparser
+    config.set_main_option("sqlalchemy.url", db.DATABASE_URL.replace("%", "%%"))
+
+target_metadata = db.Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Полнотекстовый индекс (FTS5 в SQLite, GIN по выражению в PostgreSQL)
+    # создается миграцией 0008 вручную и не описан в моделях
+    if reflected and compare_to is None and name and name.startswith(("ticket_search", "ix_tickets_search")):
+        return False
+    return True
+
+
+def compare_type(context, inspected_column, metadata_column, inspected_type, metadata_type):
+    # Миграция 0004 не трогает SQLite: там INTEGER и так 64-битный, а BigInteger
+    # моделей отражается как INTEGER. Без этого alembic check всегда видит расхождение
+    if context.dialect.name == "sqlite" and isinstance(inspected_type, Integer) and isinstance(metadata_type, Integer):
+        return False
+    return None
+
+
+def run_migrations_offline() -> None:
+    """Генерация SQL без подключения к базе (alembic upgrade --sql)"""
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+        include_object=include_object,
+        compare_type=compare_type,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    # render_as_batch нужен SQLite для ALTER TABLE через пересоздание таблицы
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True,
+        include_object=include_object,
+        compare_type=compare_type,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    connectable = async_engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif shared_connection is not None:
+    do_run_migrations(shared_connection)
+else:
+    asyncio.run(run_async_migrations())
@@ -0,0 +1,71 @@
+"""Исходная схема: users, tickets, specialist_assignments
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-11-07 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('telegram_id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('full_name', sa.String(), nullable=True),
+        sa.Column('role', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('telegram_id'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_table(
+        'specialist_assignments',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('problem_type', sa.String(), nullable=False),
+        sa.Column('specialist_username', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('problem_type', 'specialist_username', name='uq_problem_specialist'),
+    )
+    op.create_table(
+        'tickets',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('resident_id', sa.Integer(), nullable=True),
+        sa.Column('specialist_id', sa.Integer(), nullable=True),
+        sa.Column('responsible_specialist_id', sa.Integer(), nullable=True),
+        sa.Column('location_queue', sa.String(), nullable=True),
+        sa.Column('location_entrance', sa.String(), nullable=True),
+        sa.Column('location_floor', sa.String(), nullable=True),
+        sa.Column('problem_type', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('photo_id', sa.String(), nullable=True),
+        sa.Column('completion_comment', sa.String(), nullable=True),
+        sa.Column('completion_photo_id', sa.String(), nullable=True),
+        sa.Column('taken_at', sa.DateTime(), nullable=True),
+        sa.Column('estimated_days', sa.Integer(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['resident_id'], ['users.telegram_id']),
+        sa.ForeignKeyConstraint(['specialist_id'], ['users.telegram_id']),
+        sa.ForeignKeyConstraint(['responsible_specialist_id'], ['users.telegram_id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('tickets')
+    op.drop_table('specialist_assignments')
+    op.drop_table('users')
@@ -0,0 +1,35 @@
+"""Индексы для горячих запросов по заявкам и назначениям
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_tickets_created_at_id', 'tickets', ['created_at', 'id'])
+    op.create_index('ix_tickets_problem_type_status_created_at', 'tickets', ['problem_type', 'status', 'created_at', 'id'])
+    op.create_index('ix_tickets_status_created_at', 'tickets', ['status', 'created_at'])
+    op.create_index('ix_tickets_resident_id_created_at', 'tickets', ['resident_id', 'created_at', 'id'])
+    op.create_index('ix_tickets_responsible_specialist_id', 'tickets', ['responsible_specialist_id'])
+    op.create_index('ix_specialist_assignments_specialist_username', 'specialist_assignments', ['specialist_username'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_specialist_assignments_specialist_username', table_name='specialist_assignments')
+    op.drop_index('ix_tickets_responsible_specialist_id', table_name='tickets')
+    op.drop_index('ix_tickets_resident_id_created_at', table_name='tickets')
+    op.drop_index('ix_tickets_status_created_at', table_name='tickets')
+    op.drop_index('ix_tickets_problem_type_status_created_at', table_name='tickets')
+    op.drop_index('ix_tickets_created_at_id', table_name='tickets')
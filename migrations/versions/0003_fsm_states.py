@@ -0,0 +1,35 @@
+"""Таблица для хранения состояний FSM
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fsm_states',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=True),
+        sa.Column('data', sa.String(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_fsm_states_updated_at', 'fsm_states', ['updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_fsm_states_updated_at', table_name='fsm_states')
+    op.drop_table('fsm_states')
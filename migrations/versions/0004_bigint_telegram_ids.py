@@ -0,0 +1,37 @@
+"""BIGINT для Telegram ID (не помещаются в integer PostgreSQL)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TICKET_USER_COLUMNS = ('resident_id', 'specialist_id', 'responsible_specialist_id')
+
+
+def upgrade() -> None:
+    # В SQLite INTEGER и так 64-битный, пересоздавать таблицы незачем
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    op.alter_column('users', 'telegram_id', type_=sa.BigInteger(), existing_type=sa.Integer(), existing_nullable=False)
+    for column in TICKET_USER_COLUMNS:
+        op.alter_column('tickets', column, type_=sa.BigInteger(), existing_type=sa.Integer())
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    for column in TICKET_USER_COLUMNS:
+        op.alter_column('tickets', column, type_=sa.Integer(), existing_type=sa.BigInteger())
+    op.alter_column('users', 'telegram_id', type_=sa.Integer(), existing_type=sa.BigInteger(), existing_nullable=False)
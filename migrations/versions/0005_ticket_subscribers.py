@@ -0,0 +1,34 @@
+"""Подписчики заявок (жители, сообщившие о той же проблеме)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ticket_subscribers',
+        sa.Column('ticket_id', sa.Integer(), nullable=False),
+        sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id']),
+        sa.ForeignKeyConstraint(['telegram_id'], ['users.telegram_id']),
+        sa.PrimaryKeyConstraint('ticket_id', 'telegram_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ticket_subscribers')
@@ -0,0 +1,98 @@
+"""Накопительная статистика заявок для /mod_stats
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16 00:00:00
+
+"""
+import bisect
+from datetime import timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Копия database.DURATION_BUCKET_HOURS на момент миграции
+DURATION_BUCKET_HOURS = [0.25, 0.5, 1, 2, 3, 4, 6, 8, 12, 18, 24, 36, 48, 72, 96, 120, 168, 240, 336, 504, 720]
+OPEN_STATUSES = ["Новая", "Взята в работу"]
+
+
+def _backfill(stats_table, durations_table):
+    """Заполняет агрегаты по уже существующим заявкам"""
+    bind = op.get_bind()
+    tickets = sa.table(
+        'tickets',
+        sa.column('problem_type'), sa.column('status'), sa.column('responsible_specialist_id'),
+        sa.column('created_at', sa.DateTime), sa.column('taken_at', sa.DateTime),
+        sa.column('completed_at', sa.DateTime), sa.column('estimated_days'),
+    )
+    stats = {}
+    durations = {}
+
+    def add(scopes, metric=None, seconds=None, **deltas):
+        for scope in scopes:
+            row = stats.setdefault(scope, dict(created=0, taken=0, completed=0, closed=0, overdue=0))
+            for name, value in deltas.items():
+                row[name] += value
+            if metric is not None:
+                bucket = bisect.bisect_left(DURATION_BUCKET_HOURS, seconds / 3600)
+                key = scope + (metric, bucket)
+                durations[key] = durations.get(key, 0) + 1
+
+    for t in bind.execute(sa.select(tickets)):
+        if t.created_at is None:
+            continue
+        scopes = [('all', ''), ('problem_type', t.problem_type or '')]
+        add(scopes, created=1)
+        if t.responsible_specialist_id:
+            scopes.append(('specialist', str(t.responsible_specialist_id)))
+        if t.taken_at:
+            add(scopes, 'take', (t.taken_at - t.created_at).total_seconds(), taken=1)
+        if t.completed_at:
+            overdue = bool(t.taken_at and t.estimated_days and t.completed_at > t.taken_at + timedelta(days=t.estimated_days))
+            add(scopes, 'complete', (t.completed_at - t.created_at).total_seconds(), completed=1, overdue=int(overdue))
+        if t.status not in OPEN_STATUSES:
+            add(scopes, closed=1)
+
+    if stats:
+        op.bulk_insert(stats_table, [dict(dimension=d, key=k, **row) for (d, k), row in stats.items()])
+    if durations:
+        op.bulk_insert(durations_table, [
+            dict(dimension=d, key=k, metric=m, bucket=b, count=c) for (d, k, m, b), c in durations.items()
+        ])
+
+
+def upgrade() -> None:
+    stats_table = op.create_table(
+        'ticket_stats',
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('created', sa.Integer(), nullable=False),
+        sa.Column('taken', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Integer(), nullable=False),
+        sa.Column('closed', sa.Integer(), nullable=False),
+        sa.Column('overdue', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('dimension', 'key'),
+    )
+    durations_table = op.create_table(
+        'ticket_stat_durations',
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('metric', sa.String(), nullable=False),
+        sa.Column('bucket', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('dimension', 'key', 'metric', 'bucket'),
+    )
+    _backfill(stats_table, durations_table)
+
+
+def downgrade() -> None:
+    op.drop_table('ticket_stat_durations')
+    op.drop_table('ticket_stats')
@@ -0,0 +1,29 @@
+"""Отметки о напоминании и эскалации просроченных заявок
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tickets', sa.Column('deadline_reminded_at', sa.DateTime(), nullable=True))
+    op.add_column('tickets', sa.Column('deadline_escalated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('tickets') as batch_op:
+        batch_op.drop_column('deadline_escalated_at')
+        batch_op.drop_column('deadline_reminded_at')
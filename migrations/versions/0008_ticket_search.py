@@ -0,0 +1,62 @@
+"""Полнотекстовый поиск по заявкам
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from stemmer import search_document
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Должно совпадать с database._pg_search_vector()
+PG_SEARCH_VECTOR = (
+    "to_tsvector('russian'::regconfig, "
+    "coalesce(problem_type, '') || ' ' || coalesce(description, '') || ' ' || "
+    "coalesce(completion_comment, '') || ' ' || coalesce('очередь ' || location_queue, '') || ' ' || "
+    "coalesce('подъезд ' || location_entrance, '') || ' ' || coalesce('этаж ' || location_floor, ''))"
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute(f"CREATE INDEX ix_tickets_search ON tickets USING gin ({PG_SEARCH_VECTOR})")
+        return
+    if bind.dialect.name != 'sqlite':
+        return
+
+    op.execute("CREATE VIRTUAL TABLE ticket_search USING fts5(body, tokenize = 'unicode61 remove_diacritics 2')")
+    tickets = sa.table(
+        'tickets',
+        sa.column('id'), sa.column('problem_type'), sa.column('description'), sa.column('completion_comment'),
+        sa.column('location_queue'), sa.column('location_entrance'), sa.column('location_floor'),
+    )
+    rows = []
+    for t in bind.execute(sa.select(tickets)):
+        rows.append({'id': t.id, 'body': search_document(
+            t.problem_type, t.description, t.completion_comment,
+            f"очередь {t.location_queue}" if t.location_queue else None,
+            f"подъезд {t.location_entrance}" if t.location_entrance else None,
+            f"этаж {t.location_floor}" if t.location_floor else None,
+        )})
+    if rows:
+        bind.execute(sa.text("INSERT INTO ticket_search(rowid, body) VALUES (:id, :body)"), rows)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_tickets_search")
+    elif bind.dialect.name == 'sqlite':
+        op.execute("DROP TABLE ticket_search")
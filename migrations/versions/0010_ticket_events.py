@@ -0,0 +1,57 @@
+"""Журнал событий заявок
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ticket_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('ticket_id', sa.Integer(), nullable=False),
+        sa.Column('ts', sa.DateTime(), nullable=False),
+        sa.Column('actor_id', sa.BigInteger(), nullable=True),
+        sa.Column('from_status', sa.String(), nullable=True),
+        sa.Column('to_status', sa.String(), nullable=False),
+        sa.Column('comment', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_ticket_events_ticket_id_ts', 'ticket_events', ['ticket_id', 'ts'])
+
+    # Восстанавливаем журнал существующих заявок по их датам: создание,
+    # взятие в работу и закрытие (промежуточные смены статуса не сохранились)
+    op.execute(
+        "INSERT INTO ticket_events (ticket_id, ts, actor_id, from_status, to_status) "
+        "SELECT id, COALESCE(created_at, updated_at, CURRENT_TIMESTAMP), resident_id, NULL, 'Новая' FROM tickets"
+    )
+    op.execute(
+        "INSERT INTO ticket_events (ticket_id, ts, actor_id, from_status, to_status) "
+        "SELECT id, taken_at, responsible_specialist_id, 'Новая', 'Взята в работу' FROM tickets "
+        "WHERE taken_at IS NOT NULL"
+    )
+    op.execute(
+        "INSERT INTO ticket_events (ticket_id, ts, actor_id, from_status, to_status, comment) "
+        "SELECT id, COALESCE(completed_at, updated_at, CURRENT_TIMESTAMP), responsible_specialist_id, "
+        "CASE WHEN taken_at IS NOT NULL THEN 'Взята в работу' ELSE 'Новая' END, status, completion_comment "
+        "FROM tickets WHERE status NOT IN ('Новая', 'Взята в работу')"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ticket_events_ticket_id_ts', table_name='ticket_events')
+    op.drop_table('ticket_events')
@@ -0,0 +1,31 @@
+"""Частичный индекс открытых заявок для страницы специалиста
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_CONDITION = "status IN ('Новая', 'Взята в работу')"
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_tickets_open_problem_type_created_at', 'tickets', ['problem_type', 'created_at', 'id'],
+        sqlite_where=sa.text(OPEN_CONDITION), postgresql_where=sa.text(OPEN_CONDITION),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tickets_open_problem_type_created_at', table_name='tickets')
@@ -0,0 +1,70 @@
+"""Секундные и минутные корзины гистограмм длительностей
+
+Номера корзин сдвигаются, поэтому гистограммы пересчитываются по заявкам
+заново с новыми границами (как при заполнении в 0006).
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 00:00:00
+
+"""
+import bisect
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Копии database.DURATION_BUCKET_HOURS до и после миграции
+OLD_DURATION_BUCKET_HOURS = [0.25, 0.5, 1, 2, 3, 4, 6, 8, 12, 18, 24, 36, 48, 72, 96, 120, 168, 240, 336, 504, 720]
+DURATION_BUCKET_HOURS = [
+    10 / 3600, 30 / 3600, 1 / 60, 5 / 60,
+    0.25, 0.5, 1, 2, 3, 4, 6, 8, 12, 18, 24, 36, 48, 72, 96, 120, 168, 240, 336, 504, 720,
+]
+
+durations_table = sa.table(
+    'ticket_stat_durations',
+    sa.column('dimension'), sa.column('key'), sa.column('metric'), sa.column('bucket'), sa.column('count'),
+)
+
+
+def _rebuild(bounds):
+    bind = op.get_bind()
+    tickets = sa.table(
+        'tickets',
+        sa.column('problem_type'), sa.column('responsible_specialist_id'),
+        sa.column('created_at', sa.DateTime), sa.column('taken_at', sa.DateTime), sa.column('completed_at', sa.DateTime),
+    )
+    durations = {}
+    for t in bind.execute(sa.select(tickets)):
+        if t.created_at is None:
+            continue
+        scopes = [('all', ''), ('problem_type', t.problem_type or '')]
+        if t.responsible_specialist_id:
+            scopes.append(('specialist', str(t.responsible_specialist_id)))
+        for metric, finished_at in (('take', t.taken_at), ('complete', t.completed_at)):
+            if finished_at is None:
+                continue
+            bucket = bisect.bisect_left(bounds, (finished_at - t.created_at).total_seconds() / 3600)
+            for scope in scopes:
+                key = scope + (metric, bucket)
+                durations[key] = durations.get(key, 0) + 1
+    op.execute(durations_table.delete())
+    if durations:
+        op.bulk_insert(durations_table, [
+            dict(dimension=d, key=k, metric=m, bucket=b, count=c) for (d, k, m, b), c in durations.items()
+        ])
+
+
+def upgrade() -> None:
+    _rebuild(DURATION_BUCKET_HOURS)
+
+
+def downgrade() -> None:
+    _rebuild(OLD_DURATION_BUCKET_HOURS)
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.types import InputMediaPhoto
+
+logger = logging.getLogger(__name__)
+
+
+# --- Ограничение частоты отправки ---
+
+class TokenBucket:
+    """Token bucket: не больше rate сообщений в секунду с запасом capacity"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# --- Уведомления ---
+
+@dataclass
+class Notification:
+    """Одно исходящее сообщение и состояние его доставки"""
+    chat_id: int
+    text: str
+    photo: str | None = None
+    parse_mode: str | None = None
+    attempts: int = 0
+    status: str = 'pending'  # pending, sent, failed
+    error: str | None = None
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class NotificationDispatcher:
+    """Очередь уведомлений с пулом воркеров и учетом лимитов Telegram.
+
+    Хэндлеры только ставят сообщения в очередь и сразу продолжают работу.
+    Воркеры соблюдают общий лимит и лимит на чат, а при TelegramRetryAfter
+    выжидают указанное время и повторяют отправку.
+    """
+
+    def __init__(self, workers: int = 4, global_rate: float = 25, per_chat_rate: float = 1, max_retries: int = 3):
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate)
+        self.stats = {'enqueued': 0, 'sent': 0, 'failed': 0, 'retried': 0}
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._queue: asyncio.Queue[Notification] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._bot: Bot | None = None
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain: bool = True):
+        """Останавливает воркеров; при drain=True сначала дожидается отправки очереди"""
+        if self._queue is not None and drain:
+            await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, chat_id: int, text: str, photo: str | None = None, parse_mode: str | None = None) -> Notification:
+        notification = Notification(chat_id=chat_id, text=text, photo=photo, parse_mode=parse_mode)
+        self._queue.put_nowait(notification)
+        self.stats['enqueued'] += 1
+        return notification
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Не даем словарю расти бесконечно: удаляем давно простаивающие чаты
+            if len(self._chat_buckets) > 10000:
+                idle_before = time.monotonic() - 60
+                self._chat_buckets = {
+                    k: b for k, b in self._chat_buckets.items() if b.updated_at > idle_before
+                }
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate)
+        return bucket
+
+    async def _send(self, notification: Notification):
+        # parse_mode передаем только явно заданный, иначе действует значение бота по умолчанию
+        kwargs = {}
+        if notification.parse_mode is not None:
+            kwargs['parse_mode'] = notification.parse_mode
+        if notification.photo:
+            await self._bot.send_photo(
+                chat_id=notification.chat_id,
+                photo=notification.photo,
+                caption=notification.text,
+                **kwargs,
+            )
+        else:
+            await self._bot.send_message(
+                chat_id=notification.chat_id,
+                text=notification.text,
+                **kwargs,
+            )
+
+    async def _deliver(self, notification: Notification):
+        while True:
+            notification.attempts += 1
+            await self._chat_bucket(notification.chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                await self._send(notification)
+            except TelegramRetryAfter as e:
+                delay = e.retry_after
+            except (TelegramNetworkError, TelegramServerError) as e:
+                delay = 2 ** notification.attempts
+                notification.error = str(e)
+            except Exception as e:
+                # Бот заблокирован, чат не найден и т.п. - повтор не поможет
+                notification.status = 'failed'
+                notification.error = str(e)
+                self.stats['failed'] += 1
+                logger.warning("Не удалось отправить уведомление в чат %s: %s", notification.chat_id, e)
+                return
+            else:
+                notification.status = 'sent'
+                self.stats['sent'] += 1
+                return
+
+            if notification.attempts > self.max_retries:
+                notification.status = 'failed'
+                self.stats['failed'] += 1
+                logger.warning("Уведомление в чат %s не доставлено после %s попыток", notification.chat_id, notification.attempts)
+                return
+            self.stats['retried'] += 1
+            await asyncio.sleep(delay)
+
+    async def _worker(self):
+        while True:
+            notification = await self._queue.get()
+            try:
+                await self._deliver(notification)
+            except Exception:
+                logger.exception("Ошибка воркера уведомлений")
+            finally:
+                self._queue.task_done()
+
+
+dispatcher = NotificationDispatcher(
+    workers=int(os.getenv("NOTIFY_WORKERS", "4")),
+    global_rate=float(os.getenv("NOTIFY_GLOBAL_RATE", "25")),
+    per_chat_rate=float(os.getenv("NOTIFY_CHAT_RATE", "1")),
+)
+
+
+# --- Фото в списках заявок ---
+
+MEDIA_GROUP_SIZE = 10  # Максимум фото в одном альбоме Telegram
+
+
+class FileIdCache:
+    """Помнит file_id, которые Telegram отклонил, чтобы не отправлять их повторно"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 86400.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._invalid: OrderedDict[str, float] = OrderedDict()
+
+    def is_invalid(self, file_id: str) -> bool:
+        expires_at = self._invalid.get(file_id)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._invalid[file_id]
+            return False
+        return True
+
+    def mark_invalid(self, file_id: str):
+        self._invalid[file_id] = time.monotonic() + self.ttl
+        self._invalid.move_to_end(file_id)
+        while len(self._invalid) > self.maxsize:
+            self._invalid.popitem(last=False)
+
+
+invalid_file_ids = FileIdCache()
+
+
+# Фрагменты ответа Telegram, означающие, что отклонен сам file_id
+FILE_ID_ERRORS = ("wrong file identifier", "file_id", "file_reference")
+
+
+def _is_file_id_error(error: TelegramBadRequest) -> bool:
+    message = error.message.lower()
+    return any(marker in message for marker in FILE_ID_ERRORS)
+
+
+async def _send_album(bot: Bot, chat_id: int, photos: list[tuple[str, str]], retries: int = 1):
+    try:
+        if len(photos) == 1:
+            file_id, caption = photos[0]
+            await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption)
+        else:
+            await bot.send_media_group(
+                chat_id=chat_id,
+                media=[InputMediaPhoto(media=file_id, caption=caption) for file_id, caption in photos],
+            )
+    except TelegramRetryAfter as e:
+        if retries > 0:
+            await asyncio.sleep(e.retry_after)
+            await _send_album(bot, chat_id, photos, retries - 1)
+        else:
+            logger.warning("Фото (%s шт.) в чат %s не отправлены: лимит Telegram, повтор через %s с", len(photos), chat_id, e.retry_after)
+    except TelegramBadRequest as e:
+        if not _is_file_id_error(e):
+            # Подпись, недоступный чат и т. п. - file_id тут ни при чем
+            logger.warning("Не удалось отправить фото (%s шт.) в чат %s: %s", len(photos), chat_id, e)
+        elif len(photos) == 1:
+            invalid_file_ids.mark_invalid(photos[0][0])
+            logger.info("file_id отклонен Telegram и больше не будет отправляться: %s", e)
+        else:
+            # Альбом отклоняется целиком - отправим по одному, чтобы найти устаревший file_id
+            for photo in photos:
+                await _send_album(bot, chat_id, [photo], retries)
+    except Exception as e:
+        logger.warning("Не удалось отправить фото в чат %s: %s", chat_id, e)
+
+
+async def send_photo_albums(bot: Bot, chat_id: int, photos: list[tuple[str, str]]):
+    """Отправляет фото (file_id, подпись) альбомами по 10.
+
+    Альбомы одному получателю идут по очереди: так они приходят в исходном
+    порядке и не упираются в лимит Telegram на сообщения в один чат.
+    Параллельно отправляются только разные получатели.
+    """
+    photos = [(file_id, caption) for file_id, caption in photos if file_id and not invalid_file_ids.is_invalid(file_id)]
+    for i in range(0, len(photos), MEDIA_GROUP_SIZE):
+        await _send_album(bot, chat_id, photos[i:i + MEDIA_GROUP_SIZE])
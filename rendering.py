@@ -0,0 +1,283 @@
+from datetime import timedelta
+from functools import lru_cache
+from html import escape
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+import keyboards as kb
+
+# Тексты и клавиатуры, которые раньше собирались в хэндлерах на каждый запрос.
+# Неизменяемые - константы модуля, зависящие от данных - шаблоны str.format
+# и функции с lru_cache по полям, от которых зависит результат.
+# Закэшированные объекты разделяются между запросами: изменять их нельзя.
+
+
+# --- Справка и приветствие ---
+
+INFO_TEXT = (
+    "<b>КОНТАКТНАЯ ИНФОРМАЦИЯ</b>\n"
+    "УК «Сиди Дома»\n"
+    "🏠г. Тула, ул. Седова, д. 26 к. 1, помещение 769, офис 5 (вход со двора)\n"
+    "📧Эл.почта: sididoma71@yandex.ru\n"
+    "☎️Заместитель Директора \n"
+    "8-(993)-537-17-07 пн. – пт. (с 9:00 до 18:00);\n"
+    "☎️Директор инженерной службы 8-(933)-031-53-99 пн. – пт.  (с 9:00 до 18:00);\n\n"
+    "<b>КОНСЬЕРЖ (Аварийная служба) - Круглосуточно:</b>\n"
+    "<b>Корпус 1:</b>\n"
+    "☎️ 8-(915)-696-74-22 секция 1;\n"
+    "☎️ 8-(902)-901-06-92 секция 2.\n"
+    "<b>Корпус 2:</b>\n"
+    "☎️ 8-(902)-847-79-29 секция 1;\n"
+    "☎️ 8-(902)-846-73-31 секция 2.\n\n"
+    "<b>ОХРАНА – Круглосуточно:</b>\n"
+    "☎️ 8-(902)-750-08-63 - Охрана корпус 1; \n"
+    "☎️ 8-(953)-182-07-85 - Охрана корпус 2.\n\n"
+    "<b>МТС</b>\n"
+    "☎️Подключение сети интернет-менеджер компании МТС по ЖК «Фамилия»:\n"
+    "8-953-190-38-11- (с 9:00 до 18:00).\n"
+    "☎️Система контроля и управления доступом (домофоны/шлагбаумы):\n"
+    "Направление информации ТОЛЬКО WA/TG\n"
+    "8-(993)-537-93-90 - пн. – пт. (с 9:00 до 18:00).\n\n"
+    "<b>ООО «Лифт»</b>\n"
+    "☎️диспетчерская 8(4872)50‒03‒92 – Круглосуточно.\n\n"
+    "<b>АО «Тулагорводоканал»</b>\n"
+    "☎️ 8(4872)25-49-47, 42-53-34, 42-53-26 – Круглосуточно.\n\n"
+    "<b>АО «ТНС энерго Тула»</b>\n"
+    "☎️ 8-800-775-44-71 – Круглосуточно.\n\n"
+    "<b>ОЕИРЦ</b>\n"
+    "☎️ 8(4872)70-15-33, 70-15-34, 70-55-70 (доб.1020) - пн. – пт. (с 9:00 до 18:00)\n\n"
+    "<b>Отдел полиции по привокзальному району УМВД России г. Тула:</b>\n"
+    "☎️ 8(4872)32-47-00, 32-47-02, 39-00-79 – Круглосуточно.\n\n"
+    "<b>Администрация Привокзального района</b>\n"
+    "☎️ 8(4872)22-44-24, 22-44-66 - пн. – пт. (с 9:00 до 18:00).\n\n"
+    "<b>Государственная жилищная инспекция Тульской области</b>\n"
+    "☎️ 8(4872)24-51-60, 24-51-63 пн. – пт. (с 9:00 до 18:00)."
+)
+
+ROLE_MENUS = {
+    'resident': kb.resident_menu,
+    'specialist': kb.specialist_menu,
+    'manager': kb.manager_menu,
+}
+
+WELCOME_TEMPLATE = (
+    "Здравствуйте! 👋\n\n"
+    "Ваша роль: <b>{role}</b>\n\n"
+    "Я чат-бот вашей Управляющей Компании. "
+    "Готов помочь вам с решением бытовых вопросов."
+)
+
+
+def menu_for_role(role: str):
+    return ROLE_MENUS.get(role, kb.resident_menu)
+
+
+@lru_cache(maxsize=16)
+def welcome_text(role: str) -> str:
+    return WELCOME_TEMPLATE.format(role=role)
+
+
+# --- Списки заявок ---
+
+DATETIME_FORMAT = '%d.%m.%Y %H:%M'
+TICKET_SUMMARY = "#{id} • {problem_type} • {status}"
+ALL_TICKETS_ENTRY = "<b>#{id}</b> • {problem_type} • {status}\n<b>Создана:</b> {created_at}"
+ALL_TICKETS_PHOTO_CAPTION = TICKET_SUMMARY + "\nСоздана: {created_at}"
+
+STATUS_ICONS = {
+    'Новая': '🆕',
+    'Взята в работу': '🛠',
+    'Выполнено': '✅',
+    'Проблема не выявлена': '❔',
+}
+
+
+def responsible_name(ticket) -> str | None:
+    """username ответственного специалиста (или ID:..., если он не писал боту)"""
+    if not ticket.responsible_specialist_id:
+        return None
+    user = ticket.responsible_specialist
+    return user.username if user else f"ID:{ticket.responsible_specialist_id}"
+
+
+def ticket_summaries(tickets) -> tuple:
+    """Ключ для кэшей клавиатур: (id, тип, статус) каждой заявки страницы"""
+    return tuple((t.id, t.problem_type, t.status) for t in tickets)
+
+
+@lru_cache(maxsize=4096)
+def specialist_ticket_line(ticket_id: int, problem_type: str, status: str, responsible: str | None) -> str:
+    line = TICKET_SUMMARY.format(id=ticket_id, problem_type=problem_type, status=status)
+    if responsible:
+        line += f" (Ответственный: @{responsible})"
+    return line
+
+
+def ticket_photo_caption(ticket) -> str:
+    return TICKET_SUMMARY.format(id=ticket.id, problem_type=ticket.problem_type, status=ticket.status)
+
+
+@lru_cache(maxsize=4096)
+def all_tickets_entry(ticket_id, problem_type, status, created_at, taken_at, estimated_days, completed_at, responsible) -> str:
+    """Карточка заявки в списке «Все заявки»"""
+    details = ALL_TICKETS_ENTRY.format(
+        id=ticket_id, problem_type=problem_type, status=status, created_at=created_at.strftime(DATETIME_FORMAT),
+    )
+    if taken_at:
+        details += f"\n<b>Взята в работу:</b> {taken_at.strftime(DATETIME_FORMAT)}"
+    if estimated_days is not None:
+        days_text = f"{estimated_days} дней" if estimated_days and estimated_days > 0 else "неизвестно"
+        details += f"\n<b>Срок выполнения:</b> {days_text}"
+    if completed_at:
+        details += f"\n<b>Выполнена:</b> {completed_at.strftime(DATETIME_FORMAT)}"
+    if responsible:
+        details += f"\n<b>Ответственный:</b> @{responsible}"
+    return details
+
+
+def all_tickets_photo_caption(ticket) -> str:
+    return ALL_TICKETS_PHOTO_CAPTION.format(
+        id=ticket.id, problem_type=ticket.problem_type, status=ticket.status,
+        created_at=ticket.created_at.strftime(DATETIME_FORMAT),
+    )
+
+
+@lru_cache(maxsize=4096)
+def resident_ticket_line(ticket_id: int, problem_type: str, status: str, created_at, taken_at, estimated_days) -> str:
+    """Строка списка «Мои заявки» жителя"""
+    line = f"{STATUS_ICONS.get(status, '•')} <b>#{ticket_id}</b> {problem_type} — {status}, от {created_at.strftime('%d.%m.%Y')}"
+    if status == 'Взята в работу' and taken_at and estimated_days:
+        line += f", срок до {(taken_at + timedelta(days=estimated_days)).strftime('%d.%m.%Y')}"
+    return line
+
+
+# --- Клавиатуры списков ---
+
+@lru_cache(maxsize=1024)
+def next_page_keyboard(callback_prefix: str, cursor: str, text: str = "Следующие заявки") -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text=text, callback_data=f"{callback_prefix}{cursor}")]])
+
+
+@lru_cache(maxsize=1024)
+def tickets_page_keyboard(summaries: tuple, next_cursor: str | None) -> InlineKeyboardMarkup:
+    """Клавиатура выбора заявки для смены статуса; summaries - из ticket_summaries()"""
+    keyboard_buttons = [
+        [InlineKeyboardButton(
+            text=TICKET_SUMMARY.format(id=ticket_id, problem_type=problem_type, status=status),
+            callback_data=f"ticket_{ticket_id}",
+        )]
+        for ticket_id, problem_type, status in summaries
+    ]
+    # Кнопка следующей страницы, если есть ещё
+    if next_cursor:
+        keyboard_buttons.append([InlineKeyboardButton(text="Следующие заявки", callback_data=f"tickets_next_{next_cursor}")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
+
+@lru_cache(maxsize=1024)
+def resident_tickets_keyboard(ticket_ids: tuple, next_cursor: str | None) -> InlineKeyboardMarkup:
+    """Кнопки карточек заявок жителя по 5 в ряд и переход к более ранним"""
+    buttons = [InlineKeyboardButton(text=f"#{ticket_id}", callback_data=f"my_ticket_{ticket_id}") for ticket_id in ticket_ids]
+    keyboard_rows = [buttons[i:i + 5] for i in range(0, len(buttons), 5)]
+    if next_cursor:
+        keyboard_rows.append([InlineKeyboardButton(text="Более ранние заявки", callback_data=f"my_tickets_next_{next_cursor}")])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
+
+
+# --- Карточка заявки ---
+
+TICKET_CARD = (
+    "<b>Заявка №{id}</b>\n\n"
+    "<b>Статус:</b> {status}\n"
+    "<b>Проблема:</b> {problem_type}\n"
+    "<b>Описание:</b> {description}\n"
+    "<b>Дата создания:</b> {created_at}"
+)
+
+
+def ticket_card(ticket) -> str:
+    """Полная карточка заявки для проверки статуса"""
+    response = TICKET_CARD.format(
+        id=ticket.id, status=ticket.status, problem_type=ticket.problem_type,
+        description=ticket.description, created_at=ticket.created_at.strftime(DATETIME_FORMAT),
+    )
+    if ticket.responsible_specialist_id:
+        responsible_user = ticket.responsible_specialist
+        if responsible_user:
+            response += f"\n<b>Ответственный:</b> @{responsible_user.username}"
+        else:
+            response += f"\n<b>Ответственный:</b> ID:{ticket.responsible_specialist_id}"
+    # Информация о взятии в работу, если есть
+    if ticket.taken_at:
+        response += f"\n<b>Дата взятия в работу:</b> {ticket.taken_at.strftime(DATETIME_FORMAT)}"
+        if ticket.estimated_days is not None:
+            days_text = f"{ticket.estimated_days} дней" if ticket.estimated_days > 0 else "неизвестно"
+            response += f"\n<b>Срок выполнения:</b> {days_text}"
+    # Информация о завершении, если заявка выполнена
+    if ticket.status == 'Выполнено':
+        if ticket.completed_at:
+            response += f"\n<b>Дата выполнения:</b> {ticket.completed_at.strftime(DATETIME_FORMAT)}"
+        if ticket.completion_comment:
+            response += f"\n\n<b>Комментарий специалиста:</b>\n{ticket.completion_comment}"
+    return response
+
+
+# --- Отказ в смене статуса ---
+
+def transition_conflict_text(ticket_id: int, status: str, conflict: str, current_status: str | None) -> str:
+    """Сообщение специалисту, если db.transition_ticket_status не изменил заявку"""
+    if conflict == 'not_found':
+        return f"Заявка #{ticket_id} не найдена."
+    if conflict == 'stale':
+        return (
+            f"⚠️ Заявку #{ticket_id} изменили, пока вы с ней работали (сейчас: {current_status}).\n"
+            f"Откройте список заявок заново и повторите."
+        )
+    if current_status == 'Новая':
+        return f"⚠️ Заявка #{ticket_id} еще не взята в работу. Сначала выберите «Взята в работу»."
+    return f"⚠️ Заявка #{ticket_id} уже в статусе «{current_status}», перевести ее в «{status}» нельзя."
+
+
+# --- Журнал заявки ---
+
+HISTORY_COMMENT_LIMIT = 200  # Чтобы 50 событий с комментариями уместились в одно сообщение
+
+
+def ticket_history_text(ticket_id: int, events) -> str:
+    """История заявки для /mod_history: события (TicketEvent, username) по времени"""
+    lines = [f"<b>История заявки #{ticket_id}</b>"]
+    for event, username in events:
+        actor = f"@{username}" if username else f"ID:{event.actor_id}" if event.actor_id else "система"
+        icon = STATUS_ICONS.get(event.to_status, '•')
+        if not event.from_status:
+            change = f"создана ({event.to_status})"
+        elif event.from_status == event.to_status:
+            change = f"{event.to_status}, без смены статуса"  # Например, передача другому специалисту
+        else:
+            change = f"{event.from_status} → {event.to_status}"
+        line = f"{icon} {event.ts.strftime(DATETIME_FORMAT)} — {escape(actor)}: {change}"
+        if event.comment:
+            comment = event.comment
+            if len(comment) > HISTORY_COMMENT_LIMIT:
+                comment = comment[:HISTORY_COMMENT_LIMIT] + "…"
+            line += f"\n    <i>{escape(comment)}</i>"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+# --- Массовые операции модератора ---
+
+BULK_LIST_LIMIT = 30  # Заявок в одном сообщении; остальные - числом
+
+
+def ticket_list_lines(tickets) -> str:
+    """Короткий список заявок для итогов и уведомлений массовых операций"""
+    lines = [TICKET_SUMMARY.format(id=t.id, problem_type=t.problem_type, status=t.status) for t in tickets[:BULK_LIST_LIMIT]]
+    if len(tickets) > BULK_LIST_LIMIT:
+        lines.append(f"… и еще {len(tickets) - BULK_LIST_LIMIT}")
+    return "\n".join(lines)
+
+
+def bulk_filters_text(filters: dict) -> str:
+    names = {'problem_type': 'тип', 'queue': 'очередь', 'entrance': 'подъезд', 'floor': 'этаж'}
+    return ", ".join(f"{names[name]}: {escape(value)}" for name, value in filters.items())
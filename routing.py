@@ -0,0 +1,62 @@
+import asyncio
+import logging
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+
+class SpecialistRoutingTable:
+    """Таблица маршрутизации заявок: тип проблемы -> [(username, telegram_id)].
+
+    Назначения хранят username, поэтому раньше на каждую заявку уходили запросы
+    к specialist_assignments и users. Теперь таблица строится один раз при
+    старте и обновляется по событиям database.py: новое назначение, запись
+    пользователя, смена роли. telegram_id специалиста, который еще не писал
+    боту, равен None и заполняется при его первом сообщении.
+    """
+
+    def __init__(self):
+        self._usernames: dict[str, list[str]] = {}
+        self._telegram_ids: dict[str, int] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def load(self):
+        async with self._load_lock:
+            assignments = await db.list_all_specialist_assignments()
+            usernames = {a.specialist_username for a in assignments}
+            users = await db.find_users_by_usernames(list(usernames))
+            self._usernames.clear()
+            for assignment in assignments:
+                self._usernames.setdefault(assignment.problem_type, []).append(assignment.specialist_username)
+            self._telegram_ids = {user.username: user.telegram_id for user in users}
+            self._loaded = True
+            logger.info(
+                "Таблица маршрутизации: %s типов проблем, %s из %s специалистов известны боту",
+                len(self._usernames), len(self._telegram_ids), len(usernames),
+            )
+
+    async def specialists_for(self, problem_type: str) -> list[tuple[str, int | None]]:
+        """Специалисты по типу проблемы: (username, telegram_id или None)"""
+        if not self._loaded:
+            await self.load()
+        return [(username, self._telegram_ids.get(username)) for username in self._usernames.get(problem_type, [])]
+
+    def on_assignment_added(self, problem_type: str, username: str):
+        usernames = self._usernames.setdefault(problem_type, [])
+        if username not in usernames:
+            usernames.append(username)
+
+    def on_user_changed(self, user):
+        # Пользователь мог сменить username: убираем старую привязку его telegram_id
+        for username, telegram_id in list(self._telegram_ids.items()):
+            if telegram_id == user.telegram_id and username != user.username:
+                del self._telegram_ids[username]
+        if user.username and any(user.username in usernames for usernames in self._usernames.values()):
+            self._telegram_ids[user.username] = user.telegram_id
+
+
+table = SpecialistRoutingTable()
+db.specialist_assignment_listeners.append(table.on_assignment_added)
+db.user_listeners.append(table.on_user_changed)
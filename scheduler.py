@@ -0,0 +1,170 @@
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable
+
+import database as db
+import notifications
+
+logger = logging.getLogger(__name__)
+
+
+def ticket_deadline(ticket) -> datetime | None:
+    """Срок выполнения заявки: taken_at + estimated_days, если он задан"""
+    if ticket.status != 'Взята в работу' or not ticket.taken_at or not ticket.estimated_days or ticket.estimated_days <= 0:
+        return None
+    return ticket.taken_at + timedelta(days=ticket.estimated_days)
+
+
+class DeadlineScheduler:
+    """Напоминания о просроченных заявках и эскалация модераторам.
+
+    Сроки держатся в min-куче по времени срабатывания, загружаются
+    из базы один раз при старте и обновляются по событию из
+    db.ticket_status_listeners. В многопроцессном режиме планировщик работает
+    только в воркере 0, а остальные воркеры пересылают ему номера измененных
+    заявок через forward (см. workers.py). Задача спит до ближайшего срока,
+    таблица заявок периодически не опрашивается. Когда срок наступил, специалисту уходит
+    напоминание, а если через escalation_delay заявка все еще в работе -
+    модераторам уходит эскалация. Отправленные этапы отмечаются в заявке,
+    поэтому после перезапуска не повторяются.
+    """
+
+    def __init__(self, escalation_delay: timedelta = timedelta(hours=24), retry_delay: timedelta = timedelta(minutes=1)):
+        self.escalation_delay = escalation_delay
+        # Пауза перед повтором этапа, упавшего с ошибкой; удваивается до часа
+        self.retry_delay = retry_delay
+        self._failures: dict[int, int] = {}
+        # (время срабатывания, заявка, этап, срок); записи с устаревшим сроком пропускаются
+        self._heap: list[tuple[datetime, int, str, datetime]] = []
+        self._deadlines: dict[int, datetime] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # В воркере без планировщика: передает номер измененной заявки в воркер 0
+        self.forward: Callable[[int], None] | None = None
+
+    async def start(self):
+        await self.reload()
+        logger.info("Планировщик сроков: %s заявок в работе со сроком", len(self._deadlines))
+        self._task = asyncio.create_task(self._run())
+
+    async def reload(self):
+        """Загружает сроки всех заявок в работе из базы"""
+        tickets = await db.get_tickets_with_deadlines()
+        for ticket in tickets:
+            self.track(ticket)
+        open_ids = {ticket.id for ticket in tickets}
+        for ticket_id in [ticket_id for ticket_id in self._deadlines if ticket_id not in open_ids]:
+            del self._deadlines[ticket_id]
+
+    async def refresh(self, ticket_id: int):
+        """Перечитывает срок одной заявки, измененной в другом воркере"""
+        ticket = await db.get_ticket_by_id(ticket_id)
+        if ticket is None:
+            self._deadlines.pop(ticket_id, None)
+        else:
+            self.track(ticket)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def track(self, ticket):
+        """Ставит, переносит или снимает срок заявки в соответствии с её текущим состоянием"""
+        deadline = ticket_deadline(ticket)
+        if deadline is None or ticket.deadline_escalated_at:
+            # Устаревшие записи кучи отбрасываются при извлечении
+            self._deadlines.pop(ticket.id, None)
+            return
+        if self._deadlines.get(ticket.id) == deadline:
+            return
+        self._deadlines[ticket.id] = deadline
+        if not ticket.deadline_reminded_at:
+            self._push(deadline, ticket.id, 'remind', deadline)
+        else:
+            self._push(deadline + self.escalation_delay, ticket.id, 'escalate', deadline)
+
+    def _push(self, when: datetime, ticket_id: int, stage: str, deadline: datetime):
+        heapq.heappush(self._heap, (when, ticket_id, stage, deadline))
+        if self._heap[0][1] == ticket_id:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            if self._heap:
+                timeout = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            if timeout is None or timeout > 0:
+                # asyncio.timeout, а не wait_for: wait_for теряет отмену, если событие
+                # выставлено одновременно с cancel(), и stop() зависает
+                try:
+                    async with asyncio.timeout(timeout):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                continue
+            when, ticket_id, stage, deadline = heapq.heappop(self._heap)
+            if self._deadlines.get(ticket_id) != deadline:
+                continue
+            try:
+                await self._fire(ticket_id, stage, deadline)
+            except Exception:
+                # Этап не выполнен (например, база недоступна) - возвращаем его в кучу
+                failures = self._failures.get(ticket_id, 0) + 1
+                self._failures[ticket_id] = failures
+                delay = min(self.retry_delay * 2 ** (failures - 1), timedelta(hours=1))
+                logger.exception("Ошибка обработки срока заявки #%s, повтор через %s", ticket_id, delay)
+                self._push(datetime.utcnow() + delay, ticket_id, stage, deadline)
+            else:
+                self._failures.pop(ticket_id, None)
+
+    async def _fire(self, ticket_id: int, stage: str, deadline: datetime):
+        # Перепроверяем по базе: заявку могли закрыть или перенести срок в другом процессе
+        ticket = await db.get_ticket_by_id(ticket_id)
+        if ticket is None or ticket_deadline(ticket) != deadline:
+            self._deadlines.pop(ticket_id, None)
+            if ticket is not None:
+                self.track(ticket)
+            return
+
+        if stage == 'remind':
+            if ticket.responsible_specialist_id:
+                notifications.dispatcher.enqueue(
+                    ticket.responsible_specialist_id,
+                    f"⏰ Истек срок выполнения заявки #{ticket.id} ({ticket.problem_type}).\n"
+                    f"Взята в работу: {ticket.taken_at.strftime('%d.%m.%Y %H:%M')}, срок: {ticket.estimated_days} дн.\n"
+                    f"Пожалуйста, завершите заявку или сообщите модератору о задержке.",
+                )
+            await db.mark_deadline_notified(ticket_id, 'remind')
+            self._push(deadline + self.escalation_delay, ticket_id, 'escalate', deadline)
+        else:
+            responsible = ticket.responsible_specialist
+            responsible_name = f"@{responsible.username}" if responsible and responsible.username else f"ID:{ticket.responsible_specialist_id}"
+            for manager in await db.list_users_by_role('manager'):
+                notifications.dispatcher.enqueue(
+                    manager.telegram_id,
+                    f"🚨 Заявка #{ticket.id} ({ticket.problem_type}) просрочена.\n"
+                    f"Срок истек: {deadline.strftime('%d.%m.%Y %H:%M')}\n"
+                    f"Ответственный: {responsible_name}",
+                )
+            await db.mark_deadline_notified(ticket_id, 'escalate')
+            self._deadlines.pop(ticket_id, None)
+
+    def on_status_changed(self, ticket):
+        """Обработчик db.ticket_status_listeners"""
+        if self._task is not None:
+            self.track(ticket)
+        elif self.forward is not None:
+            self.forward(ticket.id)
+
+
+deadlines = DeadlineScheduler(
+    escalation_delay=timedelta(hours=float(os.getenv("DEADLINE_ESCALATION_HOURS", "24"))),
+    retry_delay=timedelta(seconds=float(os.getenv("DEADLINE_RETRY_SECONDS", "60"))),
+)
+db.ticket_status_listeners.append(deadlines.on_status_changed)
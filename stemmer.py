@@ -0,0 +1,68 @@
+"""Стеммер для русского языка (алгоритм Snowball Russian, упрощенный).
+
+Используется для полнотекстового поиска по заявкам в SQLite: в FTS5 нет
+русского стеммера, поэтому в индекс и в запрос попадают уже обрезанные основы.
+"""
+import re
+
+_VOWELS = 'аеиоуыэюя'
+_RV = re.compile(rf'^(.*?[{_VOWELS}])(.*)$')
+_PERFECTIVE_GERUND = re.compile(r'((?<=[ая])(в|вши|вшись)|(ив|ивши|ившись|ыв|ывши|ывшись))$')
+_REFLEXIVE = re.compile(r'(с[яь])$')
+_ADJECTIVE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+_PARTICIPLE = re.compile(r'((?<=[ая])(ем|нн|вш|ющ|щ)|(ивш|ывш|ующ))$')
+_VERB = re.compile(
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)'
+    r'|(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю))$'
+)
+_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+# R2 внутри RV: после последовательности "гласная + согласная" дважды
+_DERIVATIONAL = re.compile(rf'[^{_VOWELS}][{_VOWELS}]+[^{_VOWELS}]+[{_VOWELS}].*ость?$')
+_WORD = re.compile(r'\w+')
+
+
+def stem(word: str) -> str:
+    word = word.lower().replace('ё', 'е')
+    match = _RV.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+
+    # Шаг 1: деепричастие, иначе возвратная частица + прилагательное/глагол/существительное
+    stripped = _PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = _REFLEXIVE.sub('', rv, 1)
+        stripped = _ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = _PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = _VERB.sub('', rv, 1)
+            rv = _NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    # Шаг 2
+    rv = re.sub('и$', '', rv)
+    # Шаг 3: словообразовательные окончания
+    if _DERIVATIONAL.search(rv):
+        rv = re.sub('ость?$', '', rv)
+    # Шаг 4: мягкий знак, превосходная степень, двойное н
+    stripped = re.sub('ь$', '', rv)
+    if stripped == rv:
+        rv = re.sub('ейше?$', '', rv)
+        rv = re.sub('нн$', 'н', rv)
+    else:
+        rv = stripped
+    return prefix + rv
+
+
+def stem_text(text: str | None) -> list[str]:
+    """Разбивает текст на слова и возвращает их основы"""
+    return [stem(word) for word in _WORD.findall(text or '')]
+
+
+def search_document(*parts: str | None) -> str:
+    """Текст для полнотекстового индекса: основы слов всех частей через пробел"""
+    return ' '.join(stem_text(' '.join(part for part in parts if part)))
@@ -0,0 +1,81 @@
+import asyncio
+import itertools
+import os
+import re
+import sys
+import time
+
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("FSM_STORAGE", "memory")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from aiogram.client.default import Default, DefaultBotProperties
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Update
+
+import database as db
+from bench_webhook import BENCH_TOKEN, RecordingSession
+
+# Теги, которые Telegram принимает в parse_mode=HTML
+_HTML_TAG = re.compile(r"</?(b|strong|i|em|u|ins|s|strike|del|code|pre|a|tg-spoiler|blockquote)(\s[^>]*)?>")
+
+
+class HtmlCheckingSession(RecordingSession):
+    """RecordingSession, которая, как Telegram, отклоняет текст с неразобранной HTML-разметкой"""
+
+    async def make_request(self, bot, method, timeout=None):
+        text = getattr(method, "text", None) or getattr(method, "caption", None)
+        parse_mode = getattr(method, "parse_mode", None)
+        if isinstance(parse_mode, Default):
+            parse_mode = bot.default[parse_mode.name]
+        if text and parse_mode == ParseMode.HTML and "<" in _HTML_TAG.sub("", text):
+            raise TelegramBadRequest(method, "Bad Request: can't parse entities")
+        return await super().make_request(bot, method, timeout)
+
+
+_dispatcher = None
+# Общий счетчик: диспетчер один на процесс и отбрасывает повторные update_id
+_ids = itertools.count(1)
+
+
+def message_update(user_id: int, text: str) -> Update:
+    user = {"id": user_id, "is_bot": False, "first_name": "Resident"}
+    return Update.model_validate({"update_id": next(_ids), "message": {
+        "message_id": next(_ids), "date": int(time.time()), "chat": {"id": user_id, "type": "private"},
+        "from": user, "text": text,
+    }})
+
+
+@pytest.fixture
+def bot_dispatcher():
+    """Бот с HtmlCheckingSession и диспетчер бота: роутер подключается к диспетчеру один раз на процесс"""
+    global _dispatcher
+    import bot as bot_module
+
+    bot = bot_module.Bot(
+        token=BENCH_TOKEN, session=HtmlCheckingSession(), default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    if _dispatcher is None:
+        _dispatcher = bot_module.build_dispatcher(bot)
+    return bot, _dispatcher
+
+
+@pytest.fixture
+def run_with_db(tmp_path):
+    """Запускает корутину-тест на новой базе с примененными миграциями"""
+
+    def run(test):
+        async def main():
+            db.configure_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", echo=False)
+            await db.create_db_and_tables()
+            try:
+                return await test()
+            finally:
+                await db.close_db()
+        return asyncio.run(main())
+
+    return run
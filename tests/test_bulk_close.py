@@ -0,0 +1,34 @@
+import asyncio
+
+import database as db
+import notifications
+from conftest import message_update
+
+
+def test_bulk_close_preview_escapes_comment(run_with_db, bot_dispatcher):
+    """Комментарий с < и & не ломает HTML-превью массового закрытия"""
+    from handlers import ModBulkCloseState
+
+    bot, dp = bot_dispatcher
+
+    async def test():
+        notifications.dispatcher._queue = asyncio.Queue()
+        await db.upsert_user(5, 'moderator', 'Модератор', role='manager')
+        await db.upsert_user(1, 'resident', 'Житель')
+        await db.add_new_ticket({
+            'resident_id': 1, 'problem_type': 'Проблема с водой', 'description': 'Течет кран',
+            'location_queue': '1', 'location_entrance': '1', 'location_floor': '1',
+        })
+
+        await dp.feed_update(bot, message_update(
+            5, "/mod_bulk_close type='Проблема с водой' comment='<авария> & ремонт'",
+        ))
+
+        replies = [method.text for method in bot.session.calls]
+        assert len(replies) == 1
+        assert "Комментарий: &lt;авария&gt; &amp; ремонт" in replies[0]
+        state = dp.fsm.get_context(bot, chat_id=5, user_id=5)
+        assert await state.get_state() == ModBulkCloseState.confirm.state
+        assert (await state.get_data())['bulk_comment'] == '<авария> & ремонт'
+
+    run_with_db(test)
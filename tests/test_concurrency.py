@@ -0,0 +1,64 @@
+import asyncio
+
+from sqlalchemy import select
+
+import database as db
+import notifications
+from conftest import message_update
+
+
+def test_concurrent_updates_in_fsm_state_create_one_ticket(run_with_db, bot_dispatcher):
+    """Два одновременных сообщения на шаге фото: второе видит состояние, очищенное первым"""
+    from handlers import TicketState
+
+    bot, dp = bot_dispatcher
+
+    async def test():
+        notifications.dispatcher._queue = asyncio.Queue()
+        user_id = 777
+        state = dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+        await state.set_state(TicketState.uploading_photo)
+        await state.set_data({
+            'queue': '1', 'entrance': '2', 'floor': '3',
+            'problem_type': 'Проблема с водой', 'description': 'Течет кран',
+        })
+
+        await asyncio.gather(
+            dp.feed_update(bot, message_update(user_id, "без фото")),
+            dp.feed_update(bot, message_update(user_id, "без фото")),
+        )
+
+        async with db.ReadSession() as session:
+            tickets = (await session.execute(select(db.Ticket.problem_type, db.Ticket.location_queue))).all()
+        assert tickets == [('Проблема с водой', '1')]
+        # Второе сообщение не должно дойти до отправки заявки (даже как дубликат)
+        replies = [method.text for method in bot.session.calls]
+        assert len(replies) == 1 and "Ваша заявка принята" in replies[0]
+        assert await state.get_state() is None
+
+    run_with_db(test)
+
+
+
+def test_event_isolation_serializes_and_forgets_idle_keys():
+    """Обновления одного ключа идут по очереди, блокировки отработавших ключей удаляются"""
+    from aiogram.fsm.storage.base import StorageKey
+
+    from concurrency import KeyedEventIsolation
+
+    async def test():
+        isolation = KeyedEventIsolation()
+        order = []
+
+        async def handle(chat_id, name):
+            async with isolation.lock(StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)):
+                order.append(f"{name}+")
+                await asyncio.sleep(0.01)
+                order.append(f"{name}-")
+
+        await asyncio.gather(handle(1, "a"), handle(1, "b"), handle(2, "c"))
+        assert order.index("a-") < order.index("b+")
+        assert order.index("c+") < order.index("a-")
+        assert len(isolation._locks) == 0
+
+    asyncio.run(test())
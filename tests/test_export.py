@@ -0,0 +1,31 @@
+import csv
+import os
+
+import database as db
+import export
+
+
+def test_csv_escapes_formulas(run_with_db):
+    """Описание жителя вида =HYPERLINK(...) попадает в CSV текстом, а не формулой"""
+
+    async def test():
+        await db.upsert_user(1, '=cmd', 'Житель')
+        for description in ('=HYPERLINK("http://evil")', '+1', '-2+3', '@SUM(A1)', 'Течет кран'):
+            await db.add_new_ticket({
+                'resident_id': 1, 'problem_type': 'Проблема с водой', 'description': description,
+                'location_queue': '1', 'location_entrance': '1', 'location_floor': '-1',
+            })
+        path, count = await export.export_tickets('csv')
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                rows = list(csv.DictReader(f, delimiter=';'))
+        finally:
+            os.remove(path)
+        assert count == 5
+        assert [row["Описание"] for row in rows] == [
+            '\'=HYPERLINK("http://evil")', "'+1", "'-2+3", "'@SUM(A1)", 'Течет кран',
+        ]
+        assert {row["Житель"] for row in rows} == {"'=cmd"}
+        assert {row["Этаж"] for row in rows} == {"'-1"}
+
+    run_with_db(test)
@@ -0,0 +1,18 @@
+import asyncio
+from collections import Counter
+
+import metrics
+import notifications
+
+
+def test_metric_families_are_unique(bot_dispatcher):
+    """Каждое семейство метрик выводится один раз, сколько бы раз ни собирался диспетчер"""
+    import bot as bot_module
+
+    notifications.dispatcher._queue = asyncio.Queue()
+    metrics.registry.add_collector(bot_module._queue_metrics)
+    families = Counter(
+        line.split()[2] for line in metrics.registry.render().splitlines() if line.startswith("# TYPE")
+    )
+    assert families["bot_queue_size"] == 1
+    assert [name for name, count in families.items() if count > 1] == []
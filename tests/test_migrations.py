@@ -0,0 +1,16 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_models_match_migrations(tmp_path):
+    """alembic check на SQLite: модели и миграции не расходятся (в том числе BigInteger из 0004)"""
+    # Без alembic.ini: его fileConfig отключил бы логгеры остальных тестов
+    config = Config()
+    config.set_main_option('script_location', os.path.join(ROOT, 'migrations'))
+    config.set_main_option('sqlalchemy.url', f"sqlite+aiosqlite:///{tmp_path / 'check.db'}")
+    command.upgrade(config, 'head')
+    command.check(config)
@@ -0,0 +1,41 @@
+import asyncio
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import SendPhoto
+
+import notifications
+
+
+class _FailingBot:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    async def send_photo(self, **kwargs):
+        self.calls += 1
+        raise self.error(SendPhoto(chat_id=kwargs['chat_id'], photo=kwargs['photo']))
+
+
+def test_only_file_id_errors_mark_photo_invalid(caplog, monkeypatch):
+    """Ошибка подписи или чата не помечает file_id, ошибка file_id - помечает"""
+    monkeypatch.setattr(notifications, 'invalid_file_ids', notifications.FileIdCache())
+
+    async def send(file_id, message):
+        bot = _FailingBot(lambda method: TelegramBadRequest(method, message))
+        await notifications.send_photo_albums(bot, 1, [(file_id, None)])
+
+    asyncio.run(send('caption', "Bad Request: message caption is too long"))
+    asyncio.run(send('chat', "Bad Request: chat not found"))
+    asyncio.run(send('stale', "Bad Request: wrong file identifier/HTTP URL specified"))
+    assert not notifications.invalid_file_ids.is_invalid('caption')
+    assert not notifications.invalid_file_ids.is_invalid('chat')
+    assert notifications.invalid_file_ids.is_invalid('stale')
+    assert "chat not found" in caplog.text
+
+
+def test_repeated_retry_after_is_logged(caplog):
+    """Повторный RetryAfter не теряет альбом молча"""
+    bot = _FailingBot(lambda method: TelegramRetryAfter(method, "Too Many Requests", retry_after=0))
+    asyncio.run(notifications.send_photo_albums(bot, 1, [('photo', None)]))
+    assert bot.calls == 2
+    assert "лимит Telegram" in caplog.text
@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import event, text
+
+import database as db
+
+PROBLEM_TYPES = ['Проблема с водой', 'Проблема с электричеством', 'Проблема с лифтом']
+
+
+async def _seed():
+    await db.upsert_user(1, 'resident', 'Житель')
+    for problem_type in PROBLEM_TYPES[:2]:
+        await db.add_specialist_for_problem(problem_type, 'plumber')
+    await db.add_specialist_for_problem(PROBLEM_TYPES[2], 'liftman')
+    for i in range(12):
+        await db.add_new_ticket({
+            'resident_id': 1, 'problem_type': PROBLEM_TYPES[i % 3], 'description': f'Заявка {i}',
+            'location_queue': '1', 'location_entrance': '1', 'location_floor': '1',
+        })
+
+
+async def _query_plans(fn):
+    """Планы всех SELECT по tickets, которые выполняет fn"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'tickets' in statement:
+            statements.append((statement, parameters))
+
+    event.listen(db.read_engine.sync_engine, 'before_cursor_execute', capture)
+    try:
+        await fn()
+    finally:
+        event.remove(db.read_engine.sync_engine, 'before_cursor_execute', capture)
+    assert statements
+    plans = []
+    async with db.read_engine.connect() as conn:
+        for statement, parameters in statements:
+            raw = await conn.get_raw_connection()
+            cursor = await raw.driver_connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            plans.append([row[3] for row in await cursor.fetchall()])
+    return plans
+
+
+async def _hot_queries():
+    page, cursor = await db.get_open_tickets_page_for_specialist_username('plumber', limit=3)
+    assert len(page) == 3 and cursor is not None
+    next_page, _ = await db.get_open_tickets_page_for_specialist_username('plumber', cursor, limit=3)
+    assert [t.id for t in page + next_page] == sorted((t.id for t in page + next_page), reverse=True)
+    return {
+        'specialist_page': lambda: db.get_open_tickets_page_for_specialist_username('plumber', limit=3),
+        'specialist_page_next': lambda: db.get_open_tickets_page_for_specialist_username('plumber', cursor, limit=3),
+        # Открытые заявки одного типа - страница специалиста с одним направлением
+        'open_by_type': lambda: db.get_open_tickets_page_for_specialist_username('liftman', limit=3),
+        'resident_page': lambda: db.get_tickets_page_for_resident(1, limit=3),
+        'resident_page_next': lambda: db.get_tickets_page_for_resident(1, cursor, limit=3),
+    }
+
+
+@pytest.mark.parametrize('name', [
+    'open_by_type', 'specialist_page', 'specialist_page_next',
+    'resident_page', 'resident_page_next',
+])
+def test_hot_queries_use_indexes(run_with_db, name):
+    """Горячие запросы по заявкам не читают tickets целиком, страницы специалиста не сортируют"""
+
+    async def test():
+        await _seed()
+        # Без статистики планировщик выбирает индексы так же, как на пустой базе бота
+        async with db.engine.begin() as conn:
+            await conn.execute(text('DROP TABLE IF EXISTS sqlite_stat1'))
+        plans = await _query_plans((await _hot_queries())[name])
+        for plan in plans:
+            assert 'SCAN tickets' not in plan, plan
+            if not name.startswith('resident_page'):
+                assert not any('TEMP B-TREE' in detail for detail in plan), plan
+
+    run_with_db(test)
@@ -0,0 +1,31 @@
+import database as db
+
+
+def test_reassign_notifies_status_listeners(run_with_db):
+    """Передача заявок вызывает слушателей по каждой заявке и пишет журнал"""
+
+    async def test():
+        await db.upsert_user(1, 'resident', 'Житель')
+        ticket_ids = []
+        for problem_type in ('Проблема с водой', 'Проблема с лифтом'):
+            ticket = await db.add_new_ticket({
+                'resident_id': 1, 'problem_type': problem_type, 'description': 'Не работает',
+                'location_queue': '1', 'location_entrance': '1', 'location_floor': '1',
+            })
+            await db.transition_ticket_status(ticket.id, 'Взята в работу', responsible_specialist_id=10, estimated_days=1, actor_id=10)
+            ticket_ids.append(ticket.id)
+
+        seen = []
+        listener = lambda ticket: seen.append((ticket.id, ticket.responsible_specialist_id))
+        db.ticket_status_listeners.append(listener)
+        try:
+            tickets = await db.reassign_open_tickets(10, 20, actor_id=99)
+        finally:
+            db.ticket_status_listeners.remove(listener)
+
+        assert sorted(seen) == [(ticket_id, 20) for ticket_id in ticket_ids]
+        assert {ticket.id for ticket in tickets} == set(ticket_ids)
+        events = await db.get_ticket_events(ticket_ids[0])
+        assert any(event.actor_id == 99 for event, _ in events)
+
+    run_with_db(test)
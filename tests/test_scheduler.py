@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from scheduler import DeadlineScheduler
+
+
+def test_failed_stage_is_retried():
+    """Ошибка при обработке срока не теряет запись: этап повторяется после паузы"""
+
+    async def test():
+        scheduler = DeadlineScheduler(retry_delay=timedelta(milliseconds=10))
+        calls = []
+
+        async def fire(ticket_id, stage, deadline):
+            calls.append((ticket_id, stage))
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            scheduler._deadlines.pop(ticket_id, None)
+
+        scheduler._fire = fire
+        scheduler.track(SimpleNamespace(
+            id=1, status='Взята в работу', taken_at=datetime.utcnow() - timedelta(days=2), estimated_days=1,
+            deadline_reminded_at=None, deadline_escalated_at=None,
+        ))
+        scheduler._task = asyncio.create_task(scheduler._run())
+        for _ in range(100):
+            if len(calls) >= 2:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(scheduler.stop(), 1)
+        assert calls == [(1, 'remind'), (1, 'remind')]
+        assert scheduler._failures == {}
+
+    asyncio.run(test())
+
+
+def test_worker_without_scheduler_forwards_changes():
+    """Воркер без планировщика не ведет сроки сам, а передает номер заявки воркеру 0"""
+    scheduler = DeadlineScheduler()
+    forwarded = []
+    scheduler.forward = forwarded.append
+    scheduler.on_status_changed(SimpleNamespace(
+        id=7, status='Взята в работу', taken_at=datetime.utcnow(), estimated_days=1,
+        deadline_reminded_at=None, deadline_escalated_at=None,
+    ))
+    assert forwarded == [7]
+    assert scheduler._deadlines == {}
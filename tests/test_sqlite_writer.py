@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+import database as db
+
+
+def _insert(telegram_id):
+    async def write(session):
+        session.add(db.User(telegram_id=telegram_id, username=f'user{telegram_id}'))
+        await session.flush()
+        return telegram_id
+    return write
+
+
+async def _cancelled_job(session):
+    raise asyncio.CancelledError()
+
+
+def test_cancelled_job_does_not_hang_batch(run_with_db):
+    """Задание, бросившее CancelledError, не оставляет соседей по пачке без ответа"""
+
+    async def test():
+        assert db.writer is not None
+        results = await asyncio.wait_for(asyncio.gather(
+            db.run_write(_insert(1)), db.run_write(_cancelled_job), db.run_write(_insert(2)),
+            return_exceptions=True,
+        ), 5)
+        assert results[0] == 1 and results[2] == 2
+        assert isinstance(results[1], asyncio.CancelledError)
+        async with db.ReadSession() as session:
+            ids = (await session.execute(select(db.User.telegram_id).order_by(db.User.telegram_id))).scalars().all()
+        assert ids == [1, 2]
+        # Писатель продолжает работать
+        assert await asyncio.wait_for(db.run_write(_insert(3)), 5) == 3
+
+    run_with_db(test)
+
+
+def test_writer_close_mid_batch_cancels_waiters(run_with_db):
+    """Остановка писателя посреди пачки отменяет ожидающих run_write"""
+
+    async def test():
+        started = asyncio.Event()
+
+        async def slow(session):
+            started.set()
+            await asyncio.Event().wait()
+
+        waiters = [asyncio.create_task(db.run_write(slow)), asyncio.create_task(db.run_write(_insert(1)))]
+        await asyncio.wait_for(started.wait(), 5)
+        await db.writer.close()
+        for waiter in waiters:
+            with pytest.raises(asyncio.CancelledError):
+                await asyncio.wait_for(waiter, 5)
+
+    run_with_db(test)
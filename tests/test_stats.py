@@ -0,0 +1,20 @@
+import database as db
+
+
+def test_quick_take_has_sub_minute_median(run_with_db):
+    """Заявка, взятая сразу после создания, не дает медиану в несколько минут"""
+
+    async def test():
+        await db.upsert_user(1, 'resident', 'Житель')
+        ticket = await db.add_new_ticket({
+            'resident_id': 1, 'problem_type': 'Проблема с водой', 'description': 'Течет кран',
+            'location_queue': '1', 'location_entrance': '1', 'location_floor': '1',
+        })
+        await db.transition_ticket_status(ticket.id, 'Взята в работу', responsible_specialist_id=10, actor_id=10)
+
+        stats = await db.get_ticket_stats()
+        assert stats[('all', '')]['take_p50'] < 10
+        assert stats[('specialist', '10')]['take_p50'] < 10
+        assert stats[('specialist', '10')]['created'] == 0
+
+    run_with_db(test)
@@ -0,0 +1,38 @@
+import asyncio
+
+import database as db
+import notifications
+from conftest import message_update
+
+
+def test_take_notifies_subscribers_without_resident_row(run_with_db, bot_dispatcher):
+    """Взятие в работу уведомляет присоединившихся жителей, даже если автора нет в users"""
+    from handlers import StatusChangeState
+
+    bot, dp = bot_dispatcher
+
+    async def test():
+        notifications.dispatcher._queue = asyncio.Queue()
+        await db.upsert_user(10, 'plumber', 'Сантехник', role='specialist')
+        ticket = await db.add_new_ticket({
+            'resident_id': 1, 'problem_type': 'Проблема с водой', 'description': 'Течет <кран>',
+            'location_queue': '1', 'location_entrance': '1', 'location_floor': '1',
+        })
+        await db.add_ticket_subscriber(ticket.id, 2)
+        state = dp.fsm.get_context(bot, chat_id=10, user_id=10)
+        await state.set_state(StatusChangeState.estimated_days)
+        await state.set_data({
+            'selected_ticket_id': ticket.id, 'new_status': 'Взята в работу', 'selected_ticket_version': ticket.version,
+        })
+
+        await dp.feed_update(bot, message_update(10, "3"))
+
+        queued = {}
+        while not notifications.dispatcher._queue.empty():
+            notification = notifications.dispatcher._queue.get_nowait()
+            queued[notification.chat_id] = notification.text
+        assert set(queued) == {1, 2}
+        assert f"Заявка #{ticket.id} взята в работу" in queued[2]
+        assert "Срок выполнения:</b> 3 дн." in queued[2]
+
+    run_with_db(test)
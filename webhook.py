@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import secrets
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука, который при остановке дожидается уже принятых обновлений"""
+
+    def __init__(self, *args, drain_timeout: float = 30.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+
+    async def drain(self, app: web.Application = None):
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info("Ожидаем завершения %s обновлений", len(tasks))
+        done, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+        if pending:
+            logger.warning("Не дождались %s обновлений за %s с", len(pending), self.drain_timeout)
+
+
+def build_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    path: str,
+    secret_token: str | None,
+    drain_timeout: float = 30.0,
+    metrics_path: str = "/metrics",
+) -> web.Application:
+    """Собирает aiohttp-приложение, принимающее обновления Telegram по пути path и отдающее метрики"""
+    app = web.Application()
+    handler = DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret_token,
+        drain_timeout=drain_timeout,
+    )
+    # Порядок важен: сначала дожидаемся хэндлеров, потом останавливаем
+    # диспетчер (сброс FSM-хранилища) и закрываем сессию бота
+    app.on_shutdown.append(handler.drain)
+    setup_application(app, dp, bot=bot)
+    handler.register(app, path=path)
+    metrics.add_metrics_route(app, metrics_path)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    url: str,
+    path: str = "/webhook",
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    secret_token: str | None = None,
+    drop_pending_updates: bool = False,
+    drain_timeout: float = 30.0,
+    metrics_path: str = "/metrics",
+):
+    """Запускает бота в режиме вебхука до SIGINT/SIGTERM"""
+    # Без секрета любой, кто знает URL, сможет присылать поддельные обновления
+    secret_token = secret_token or secrets.token_urlsafe(32)
+    app = build_webhook_app(dp, bot, path, secret_token, drain_timeout, metrics_path)
+    await serve_webhook(
+        app,
+        bot,
+        url=url,
+        path=path,
+        host=host,
+        port=port,
+        secret_token=secret_token,
+        drop_pending_updates=drop_pending_updates,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+
+
+async def serve_webhook(
+    app: web.Application,
+    bot: Bot,
+    url: str,
+    path: str = "/webhook",
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    secret_token: str | None = None,
+    drop_pending_updates: bool = False,
+    allowed_updates: list[str] | None = None,
+    **_,
+):
+    """Поднимает aiohttp-приложение, регистрирует вебхук и работает до SIGINT/SIGTERM"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    await bot.set_webhook(
+        url=url,
+        secret_token=secret_token,
+        drop_pending_updates=drop_pending_updates,
+        allowed_updates=allowed_updates,
+    )
+    logger.info("Вебхук %s слушает %s:%s%s", url, host, port, path)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await stop_event.wait()
+    finally:
+        # Вебхук не удаляем: Telegram придержит обновления до следующего запуска
+        await runner.cleanup()
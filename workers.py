@@ -0,0 +1,242 @@
+"""Многопроцессный режим: один прием обновлений и N процессов-обработчиков.
+
+Процесс приема (long polling или вебхук) не разбирает обновления, а только
+определяет chat_id и кладет JSON в очередь воркера chat_id % N. Поэтому все
+обновления одного чата обрабатывает один процесс, и внутри него они идут
+строго по очереди: порядок шагов FSM сохраняется, а SqlStorage можно делить
+между процессами. Разные чаты обрабатываются параллельно и внутри воркера.
+
+Воркеры работают с общей базой. Индекс дубликатов и таблица маршрутизации
+в каждом процессе свои, поэтому они перечитываются из базы раз в
+CACHE_REFRESH_INTERVAL секунд. Планировщик сроков работает только в воркере 0;
+остальные воркеры кладут номер заявки со смененным статусом в его очередь,
+и воркер 0 перечитывает срок только этой заявки. Кэш пользователей живет USER_CACHE_TTL_WORKERS секунд, чтобы смена
+роли в одном воркере быстро доходила до остальных. Общий лимит отправки
+уведомлений делится между воркерами.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import secrets
+import signal
+from typing import Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+_STOP = None  # Сигнал воркеру: обработать очередь до конца и завершиться
+_DEADLINE = "deadline"  # (_DEADLINE, ticket_id): воркеру 0 - перечитать срок заявки
+
+
+def update_chat_id(payload: dict) -> int:
+    """chat_id обновления для выбора воркера; 0, если чата у события нет"""
+    for key, event in payload.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = event.get("from") or event.get("user")
+        if user:
+            return user["id"]
+    return 0
+
+
+class WorkerPool:
+    """Процессы-обработчики и их очереди; dispatch распределяет обновления по chat_id"""
+
+    def __init__(self, workers: int, bot_factory: Callable[[], Bot] | None = None):
+        self.workers = workers
+        self.bot_factory = bot_factory
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = [self._context.Queue() for _ in range(workers)]
+        self.results = self._context.Queue()
+        self._processes: list[multiprocessing.Process] = []
+
+    def start(self):
+        for index, queue in enumerate(self._queues):
+            process = self._context.Process(
+                target=_worker_process,
+                args=(index, self.workers, queue, self._queues[0], self.results, self.bot_factory),
+                name=f"bot-worker-{index}",
+            )
+            process.start()
+            self._processes.append(process)
+        logger.info("Запущено воркеров: %s", self.workers)
+
+    def dispatch(self, update_json: str, chat_id: int | None = None):
+        if chat_id is None:
+            chat_id = update_chat_id(json.loads(update_json))
+        self._queues[chat_id % self.workers].put((chat_id, update_json))
+
+    async def wait_ready(self):
+        """Дожидается, пока все воркеры выполнят on_startup"""
+        loop = asyncio.get_running_loop()
+        for _ in self._processes:
+            await loop.run_in_executor(None, self.results.get)
+
+    async def stop(self) -> list[dict]:
+        """Дожидается, пока воркеры обработают очереди, и возвращает их итоги"""
+        for queue in self._queues:
+            queue.put(_STOP)
+        loop = asyncio.get_running_loop()
+        results = [await loop.run_in_executor(None, self.results.get) for _ in self._processes]
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+        self._processes.clear()
+        return results
+
+
+# --- Воркер ---
+
+class ChatSerializer:
+    """Запускает обработку обновлений параллельно, но в порядке поступления внутри чата"""
+
+    def __init__(self):
+        self._tails: dict[int, asyncio.Task] = {}
+
+    def submit(self, chat_id: int, coro_factory: Callable):
+        previous = self._tails.get(chat_id)
+        task = asyncio.create_task(self._run_after(previous, coro_factory))
+        self._tails[chat_id] = task
+        task.add_done_callback(lambda t: self._tails.pop(chat_id, None) if self._tails.get(chat_id) is t else None)
+
+    @staticmethod
+    async def _run_after(previous: asyncio.Task | None, coro_factory: Callable):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await coro_factory()
+        except Exception:
+            logger.exception("Ошибка обработки обновления")
+
+    async def join(self):
+        while self._tails:
+            await asyncio.gather(*list(self._tails.values()), return_exceptions=True)
+
+
+def _worker_process(index: int, workers: int, queue, scheduler_queue, results, bot_factory):
+    # Ctrl+C получает вся группа процессов; воркер завершается по _STOP от процесса приема
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker(index, workers, queue, scheduler_queue, results, bot_factory))
+
+
+async def _worker(index: int, workers: int, queue, scheduler_queue, results, bot_factory):
+    # Импорт bot загружает .env и настраивает логирование, как при обычном запуске
+    import bot as bot_module
+    import scheduler
+
+    if index != 0:
+        # Сроки ведет воркер 0: передаем ему заявки, измененные здесь
+        scheduler.deadlines.forward = lambda ticket_id: scheduler_queue.put((_DEADLINE, ticket_id))
+
+    bot = (bot_factory or bot_module.build_bot)()
+    dp = bot_module.build_dispatcher(bot, worker_index=index, workers=workers)
+    workflow_data = {"dispatcher": dp, "bots": [bot], "bot": bot, **dp.workflow_data}
+    await dp.emit_startup(**workflow_data)
+    results.put({"worker": index, "ready": True})
+
+    serializer = ChatSerializer()
+    loop = asyncio.get_running_loop()
+    handled = 0
+    while True:
+        item = await loop.run_in_executor(None, queue.get)
+        if item is _STOP:
+            break
+        if item[0] == _DEADLINE:
+            ticket_id = item[1]
+            serializer.submit(item, lambda ticket_id=ticket_id: scheduler.deadlines.refresh(ticket_id))
+            continue
+        chat_id, update_json = item
+        update = Update.model_validate_json(update_json, context={"bot": bot})
+        serializer.submit(chat_id, lambda update=update: dp.feed_update(bot, update))
+        handled += 1
+
+    await serializer.join()
+    # Хранилище FSM закрывается (и сбрасывается в базу) обработчиком shutdown самого aiogram
+    await dp.emit_shutdown(**workflow_data)
+    await bot.session.close()
+    results.put({"worker": index, "handled": handled})
+
+
+# --- Прием обновлений ---
+
+async def run_polling_ingress(bot: Bot, pool: WorkerPool, allowed_updates: list[str], polling_timeout: int = 30):
+    """Long polling в процессе приема: обновления сразу уходят воркерам"""
+    offset = None
+    backoff = 1.0
+    request_timeout = int((bot.session.timeout or 0) + polling_timeout)
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=polling_timeout, allowed_updates=allowed_updates, request_timeout=request_timeout,
+            )
+        except (TelegramNetworkError, TelegramServerError) as e:
+            logger.warning("Ошибка getUpdates: %s, повтор через %.0f с", e, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+            continue
+        backoff = 1.0
+        for update in updates:
+            update_json = update.model_dump_json(exclude_unset=True)
+            pool.dispatch(update_json)
+            offset = update.update_id + 1
+
+
+def build_ingress_app(pool: WorkerPool, path: str, secret_token: str | None) -> web.Application:
+    """Прием вебхука: проверка секрета и передача тела запроса воркеру без разбора в модели"""
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+            return web.Response(status=401, text="Unauthorized")
+        body = await request.text()
+        pool.dispatch(body, update_chat_id(json.loads(body)))
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+
+async def run(
+    workers: int,
+    bot: Bot,
+    allowed_updates: list[str],
+    mode: str = "polling",
+    drop_pending_updates: bool = True,
+    **webhook_options,
+):
+    """Запускает воркеров и прием обновлений до SIGINT/SIGTERM"""
+    from webhook import serve_webhook
+
+    pool = WorkerPool(workers)
+    pool.start()
+    await pool.wait_ready()
+    try:
+        if mode == "webhook":
+            # Без секрета любой, кто знает URL, сможет присылать поддельные обновления
+            webhook_options["secret_token"] = webhook_options.get("secret_token") or secrets.token_urlsafe(32)
+            app = build_ingress_app(pool, webhook_options.get("path", "/webhook"), webhook_options["secret_token"])
+            await serve_webhook(app, bot, allowed_updates=allowed_updates, drop_pending_updates=drop_pending_updates, **webhook_options)
+        else:
+            await bot.delete_webhook(drop_pending_updates=drop_pending_updates)
+            polling = asyncio.create_task(run_polling_ingress(bot, pool, allowed_updates))
+            stop_event = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, stop_event.set)
+                except NotImplementedError:  # Windows
+                    pass
+            await stop_event.wait()
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+    finally:
+        for result in await pool.stop():
+            logger.info("Воркер %s обработал обновлений: %s", result["worker"], result["handled"])
+        await bot.session.close()